@@ -0,0 +1,135 @@
+import datetime
+import json
+import platform
+import subprocess
+import tempfile
+from pathlib import Path
+from time import perf_counter
+import django
+from django.apps import apps
+from django.db import connection
+from core.benchmarks.workbook_generator import SCALES, SyntheticWorkbookGenerator
+from import_export.services.import_template_builder import ImportTemplateBuilder
+from import_export.services.import_workbook import ImportWorkbook
+from import_export.services.model_scheduler import ModelScheduler
+
+
+class ImportBenchmarkSuite:
+    """
+    Times template generation and imports of a synthetic core workbook. Scenarios:
+
+    - build_template: ImportTemplateBuilder.build_workbook() and saving the template
+    - full_import: importing the whole source into empty tables
+    - reimport: importing the same source again, so every row is an update
+    - partial_import: importing a source holding only the FinancialData sheet on top of a full import
+
+    Imports write to whatever database is configured, so run it against a test database
+    (the benchmark_import command creates one).
+    """
+
+    SCENARIOS = ('build_template', 'full_import', 'reimport', 'partial_import')
+
+    def __init__(self, scale='small', file_format='xlsx', scenarios=None, import_options=None, seed=0,
+                 work_dir=None):
+        self.scale = scale
+        self.file_format = file_format
+        self.scenarios = list(scenarios or self.SCENARIOS)
+        self.import_options = dict(import_options or {})
+        self.seed = seed
+        self.work_dir = Path(work_dir) if work_dir else None
+        self.generator = SyntheticWorkbookGenerator(scale, seed=seed)
+        self.imported = False
+
+    def run(self):
+        results = {
+            'scale': self.scale,
+            'config': SCALES[self.scale],
+            'format': self.file_format,
+            'import_options': self.import_options,
+            'seed': self.seed,
+            'commit': _get_git_commit(),
+            'started_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+            },
+            'scenarios': {},
+        }
+        with tempfile.TemporaryDirectory(dir=self.work_dir) as work_dir:
+            work_dir = Path(work_dir)
+            source, results['generate_seconds'] = _timed(self._write_source, work_dir / 'full')
+            for scenario in self.scenarios:
+                if scenario not in self.SCENARIOS:
+                    raise ValueError(f"Unknown benchmark scenario '{scenario}'")
+                results['scenarios'][scenario] = getattr(self, f"_run_{scenario}")(work_dir, source)
+        return results
+
+    def save(self, results, output_dir):
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        started_at = results['started_at'].replace(':', '').replace('-', '')
+        output_file = output_dir / f"{started_at}_{results['scale']}_{results['format']}.json"
+        with open(output_file, 'w') as f:
+            json.dump(results, f, indent=2, default=str)
+        return output_file
+
+    def _run_build_template(self, work_dir, source):
+        def build():
+            workbook = ImportTemplateBuilder('core').build_workbook()
+            workbook.save(work_dir / 'core_import_template.xlsx')
+
+        _, seconds = _timed(build)
+        return {'seconds': seconds}
+
+    def _run_full_import(self, work_dir, source):
+        self._clear_app_data()
+        result = self._import(source)
+        self.imported = True
+        return result
+
+    def _run_reimport(self, work_dir, source):
+        if not self.imported:
+            self._run_full_import(work_dir, source)
+        return self._import(source)
+
+    def _run_partial_import(self, work_dir, source):
+        if not self.imported:
+            self._run_full_import(work_dir, source)
+        partial_source = self._write_source(work_dir / 'partial', models=['FinancialData'])
+        return self._import(partial_source)
+
+    def _import(self, source):
+        results = ImportWorkbook(source, 'core', **self.import_options).import_workbook()
+        return {
+            'stats': results['stats'],
+            'failures': len(results['failures']),
+            'first_failure': results['failures'][0] if results['failures'] else None,
+        }
+
+    def _write_source(self, path, models=None):
+        if self.file_format == 'xlsx':
+            path = path.with_suffix('.xlsx')
+        return self.generator.write(path, self.file_format, models=models)
+
+    @staticmethod
+    def _clear_app_data():
+        # Children first, so PROTECT foreign keys never block the delete
+        models = ModelScheduler(apps.get_app_config('core').get_models()).get_ordered_models()
+        for model in reversed(models):
+            model._default_manager.all().delete()
+
+
+def _timed(function, *args, **kwargs):
+    start = perf_counter()
+    result = function(*args, **kwargs)
+    return result, perf_counter() - start
+
+
+def _get_git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
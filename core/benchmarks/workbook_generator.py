@@ -0,0 +1,277 @@
+import csv
+import datetime
+import json
+import random
+import warnings
+from pathlib import Path
+from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+from openpyxl.workbook.defined_name import DefinedName
+from openpyxl.worksheet.table import Table, TableColumn
+from core.models import FiscalQuarter, Period, PeriodMonth
+from import_export.services.import_template_builder import ImportTemplateBuilder
+
+# (depth, children per node) for each tree, fiscal years, and FinancialData rows
+SCALES = {
+    'tiny': {'fiscal_years': 2, 'organisation': (3, 2), 'account': (3, 3), 'project': (3, 2),
+             'financial_data': 1000},
+    'small': {'fiscal_years': 3, 'organisation': (4, 3), 'account': (4, 4), 'project': (3, 4),
+              'financial_data': 10000},
+    'deep': {'fiscal_years': 2, 'organisation': (10, 2), 'account': (12, 2), 'project': (10, 2),
+             'financial_data': 10000},
+    'medium': {'fiscal_years': 5, 'organisation': (5, 3), 'account': (5, 4), 'project': (4, 4),
+               'financial_data': 100000},
+    'large': {'fiscal_years': 10, 'organisation': (6, 3), 'account': (6, 4), 'project': (5, 4),
+              'financial_data': 1000000},
+}
+
+FORMATS = ('xlsx', 'csv', 'jsonl', 'parquet')
+
+MEASURES = ['actual', 'working forecast', 'original budget', 'revised budget']
+
+# (code, name, operator, parent code); leaf types are the ones accounts are assigned to
+ACCOUNT_TYPES = [
+    (100, 'Income Statement', 'CR', None),
+    (200, 'Balance Sheet', 'CR', None),
+    (110, 'Revenue', 'CR', 100),
+    (120, 'Expenditure', 'DR', 100),
+    (210, 'Fixed Assets', 'DR', 200),
+    (220, 'Current Assets', 'DR', 200),
+    (230, 'Current Liabilities', 'CR', 200),
+    (240, 'Long Term Liabilities', 'CR', 200),
+    (250, 'Reserves', 'CR', 200),
+]
+
+
+class SyntheticWorkbookGenerator:
+    """
+    Generates a valid import source for the core app at a given scale, with the same headers, table
+    layout and choice labels as the import template. Rows are produced lazily so the largest scales are
+    streamed straight to disk: xlsx through a write-only workbook, other formats as one file per model.
+    """
+
+    def __init__(self, scale='small', seed=0, first_year=2022):
+        self.config = SCALES[scale] if isinstance(scale, str) else scale
+        self.seed = seed
+        self.first_year = first_year
+        self.builder = ImportTemplateBuilder('core')
+        self.periods = [label for value, label in Period.PeriodChoices.choices[:14]]
+        self.fiscal_years = [
+            datetime.date(first_year + i, 4, 1) for i in range(self.config['fiscal_years'])
+        ]
+        self.organisation_codes = []
+        self.account_codes = []
+        self.project_codes = []
+
+    def get_models(self):
+        return [model for model in self.builder.app_config.get_models()
+                if model._meta.managed and not model._meta.abstract]
+
+    def get_headers(self, model_name):
+        return [field_info['header'] for field_info in self.builder.model_fields_map[model_name]]
+
+    def iter_rows(self, model_name):
+        # Row dicts keyed by header; trees are yielded parents first
+        return getattr(self, f"_iter_{model_name.lower()}")()
+
+    def write(self, path, file_format='xlsx', models=None):
+        model_names = [model.__name__ for model in self.get_models()]
+        if models:
+            model_names = [name for name in model_names if name in models]
+        if file_format == 'xlsx':
+            return self._write_xlsx(Path(path), model_names)
+        return self._write_files(Path(path), model_names, file_format)
+
+    def _iter_rows_for_headers(self, model_name):
+        headers = self.get_headers(model_name)
+        for row in self.iter_rows(model_name):
+            yield [row.get(header) for header in headers]
+
+    def _write_xlsx(self, path, model_names):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        wb = Workbook(write_only=True)
+        wb.defined_names.add(DefinedName(name="_app", attr_text='"core"'))
+        for model_name in model_names:
+            headers = self.get_headers(model_name)
+            ws = wb.create_sheet(title=model_name)
+            # Same layout as ImportTemplateBuilder: title in A1, header row 3, data from row 4 in column B
+            ws.append([model_name])
+            ws.append([])
+            ws.append([None] + headers)
+            row_count = 0
+            for values in self._iter_rows_for_headers(model_name):
+                ws.append([None] + values)
+                row_count += 1
+            ref = f"B3:{get_column_letter(1 + len(headers))}{3 + max(row_count, 1)}"
+            table = Table(displayName=model_name, ref=ref)
+            # Write-only sheets can't read the header cells back, so the table columns are declared here
+            # and openpyxl's reminder to do so is silenced
+            table.tableColumns = [TableColumn(id=i, name=header) for i, header in enumerate(headers, start=1)]
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', UserWarning)
+                ws.add_table(table)
+        wb.save(path)
+        return path
+
+    def _write_files(self, path, model_names, file_format):
+        path.mkdir(parents=True, exist_ok=True)
+        for model_name in model_names:
+            headers = self.get_headers(model_name)
+            rows = self._iter_rows_for_headers(model_name)
+            file_path = path / f"{model_name}.{file_format}"
+            if file_format == 'csv':
+                with open(file_path, 'w', newline='', encoding='utf-8') as f:
+                    writer = csv.writer(f)
+                    writer.writerow(headers)
+                    for values in rows:
+                        writer.writerow(['' if value is None else _to_text(value) for value in values])
+            elif file_format == 'jsonl':
+                with open(file_path, 'w', encoding='utf-8') as f:
+                    for values in rows:
+                        f.write(json.dumps(dict(zip(headers, values)), default=_to_text) + '\n')
+            elif file_format == 'parquet':
+                self._write_parquet(file_path, headers, rows)
+            else:
+                raise ValueError(f"Unsupported benchmark format '{file_format}'")
+        return path
+
+    @staticmethod
+    def _write_parquet(file_path, headers, rows, batch_size=100000):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        writer = None
+        try:
+            while True:
+                batch = [values for _, values in zip(range(batch_size), rows)]
+                if not batch:
+                    break
+                table = pa.table({header: [values[i] for values in batch] for i, header in enumerate(headers)})
+                if writer is None:
+                    writer = pq.ParquetWriter(file_path, table.schema)
+                writer.write_table(table.cast(writer.schema))
+        finally:
+            if writer:
+                writer.close()
+
+    def _iter_measure(self):
+        for name in MEASURES:
+            yield {'name': name}
+
+    def _iter_fiscalquarter(self):
+        for value, label in FiscalQuarter.FiscalQuarterChoices.choices:
+            yield {'quarter': label}
+
+    def _iter_period(self):
+        quarters = dict(FiscalQuarter.FiscalQuarterChoices.choices)
+        for number, label in enumerate(self.periods, start=1):
+            yield {'period': label, 'quarter': quarters[min((number - 1) // 3 + 1, 5)]}
+
+    def _iter_fiscalyear(self):
+        for start_date in self.fiscal_years:
+            yield {'start_date': start_date, 'end_date': start_date.replace(year=start_date.year + 1) - datetime.timedelta(days=1)}
+
+    def _iter_fiscalyearperiod(self):
+        for start_date in self.fiscal_years:
+            for period in self.periods:
+                yield {
+                    'fiscal_year': start_date,
+                    'period': period,
+                    'open': start_date == self.fiscal_years[-1],
+                    'default_budget': 'original budget',
+                }
+
+    def _iter_periodmonth(self):
+        months = dict(PeriodMonth.MonthChoices.choices)
+        for number, period in enumerate(self.periods, start=1):
+            # Period 01 is April; adjustment periods after Period 12 fall in March
+            yield {'period': period, 'month': months[(min(number, 12) + 2) % 12 + 1]}
+
+    def _iter_accounttype(self):
+        for code, name, operator, parent in ACCOUNT_TYPES:
+            yield {'code': code, 'name': name, 'operator': operator, 'parent': parent}
+
+    def _iter_organisation(self):
+        self.organisation_codes = []
+        for code, parent, is_leaf in self._iter_tree(self.config['organisation'], 1000000):
+            self.organisation_codes.append(code)
+            yield {'code': str(code), 'name': f"Organisation {code}", 'parent': parent and str(parent),
+                   **self._active_from()}
+
+    def _iter_account(self):
+        self.account_codes = []
+        leaf_types = [code for code, _, _, parent in ACCOUNT_TYPES if parent is not None]
+        for index, (code, parent, is_leaf) in enumerate(self._iter_tree(self.config['account'], 1000000)):
+            self.account_codes.append(code)
+            yield {'code': code, 'name': f"Account {code}", 'account_type': leaf_types[index % len(leaf_types)],
+                   'posting': is_leaf, 'parent': parent, **self._active_from()}
+
+    def _iter_project(self):
+        self.project_codes = []
+        for code, parent, is_leaf in self._iter_tree(self.config['project'], 1000000):
+            self.project_codes.append(code)
+            yield {'code': code, 'name': f"Project {code}", 'parent': parent, **self._active_from()}
+
+    def _iter_financialdata(self):
+        rng = random.Random(self.seed)
+        organisations = self.organisation_codes or [str(code) for code, _, _ in self._iter_tree(self.config['organisation'], 1000000)]
+        accounts = self.account_codes or [code for code, _, _ in self._iter_tree(self.config['account'], 1000000)]
+        projects = self.project_codes or [code for code, _, _ in self._iter_tree(self.config['project'], 1000000)]
+        fiscal_year_periods = [(start_date, period) for start_date in self.fiscal_years for period in self.periods]
+
+        dimensions = [fiscal_year_periods, organisations, accounts, projects]
+        capacity = 1
+        for values in dimensions:
+            capacity *= len(values)
+        row_count = self.config['financial_data']
+        if row_count > capacity:
+            raise ValueError(f"Scale allows at most {capacity} unique FinancialData rows, {row_count} requested.")
+
+        for index in range(row_count):
+            # Mixed-radix decomposition gives every row a distinct natural key
+            keys = []
+            for values in dimensions:
+                index, position = divmod(index, len(values))
+                keys.append(values[position])
+            (start_date, period), organisation, account, project = keys
+            actual = round(rng.uniform(-100000, 100000), 2)
+            yield {
+                'fiscal_year_period\nfiscal_year': start_date,
+                'fiscal_year_period\nperiod': period,
+                'organisation': str(organisation),
+                'account': account,
+                'project': project,
+                'actual': actual,
+                'working_forecast': round(actual * rng.uniform(0.9, 1.1), 2),
+                'original_budget': round(actual * rng.uniform(0.8, 1.2), 2),
+                'revised_budget': round(actual * rng.uniform(0.85, 1.15), 2),
+            }
+
+    def _active_from(self):
+        return {
+            'active_from\nfiscal_year': self.fiscal_years[0],
+            'active_from\nperiod': self.periods[0],
+            'active_to\nfiscal_year': None,
+            'active_to\nperiod': None,
+        }
+
+    @staticmethod
+    def _iter_tree(shape, first_code):
+        # Breadth-first (code, parent_code, is_leaf) for a tree of the given depth and fan-out
+        depth, fanout = shape
+        code = first_code
+        level = [None]
+        for current_depth in range(1, depth + 1):
+            next_level = []
+            for parent in level:
+                for _ in range(fanout):
+                    yield code, parent, current_depth == depth
+                    next_level.append(code)
+                    code += 1
+            level = next_level
+
+
+def _to_text(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
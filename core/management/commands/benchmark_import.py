@@ -0,0 +1,77 @@
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from core.benchmarks.suite import ImportBenchmarkSuite
+from core.benchmarks.workbook_generator import FORMATS, SCALES, SyntheticWorkbookGenerator
+
+
+class Command(BaseCommand):
+    help = 'Benchmark template generation and imports of a synthetic core workbook against a test database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=list(SCALES), default='small', help='Size of the synthetic workbook')
+        parser.add_argument('--format', dest='file_format', choices=FORMATS, default='xlsx',
+                            help='Source format to generate and import')
+        parser.add_argument('--scenario', action='append', choices=ImportBenchmarkSuite.SCENARIOS,
+                            help='Scenario to run (repeatable); all scenarios by default')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for the generated values')
+        parser.add_argument('--output', type=str, default=str(Path('core') / 'media' / 'import_export' / 'benchmarks'),
+                            help='Directory the JSON results are written to')
+        parser.add_argument('--generate', type=str,
+                            help='Only write the synthetic source to this path, without running any benchmark')
+        parser.add_argument('--keepdb', action='store_true', help='Reuse the test database between runs')
+        # Import options, as for import_workbook
+        parser.add_argument('--read-only', action='store_true')
+        parser.add_argument('--bulk', action='store_true')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=1)
+        parser.add_argument('--delta', action='store_true')
+        parser.add_argument('--pipeline', action='store_true')
+        parser.add_argument('--sqlite-bulk-load', action='store_true')
+        parser.add_argument('--defer-indexes', action='store_true')
+        parser.add_argument('--stats', action='store_true', help='Also record peak memory with tracemalloc')
+
+    def handle(self, *args, **options):
+        scale = options['scale']
+        file_format = options['file_format']
+
+        if options['generate']:
+            path = SyntheticWorkbookGenerator(scale, seed=options['seed']).write(options['generate'], file_format)
+            self.stdout.write(self.style.SUCCESS(f'✔ Synthetic {scale} source saved to {path}'))
+            return
+
+        import_options = {
+            'read_only': options['read_only'], 'bulk': options['bulk'], 'batch_size': options['batch_size'],
+            'workers': options['workers'], 'delta': options['delta'], 'pipeline': options['pipeline'],
+            'trace_memory': options['stats'], 'sqlite_bulk_load': options['sqlite_bulk_load'],
+            'defer_indexes': options['defer_indexes'],
+        }
+
+        # Never benchmark against real data: imports run in a freshly created test database
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            if options['workers'] > 1 and connection.vendor == 'sqlite' and connection.is_in_memory_db():
+                raise CommandError("--workers needs a file-based test database; set DATABASES TEST NAME for SQLite.")
+            suite = ImportBenchmarkSuite(
+                scale, file_format, scenarios=options['scenario'], import_options=import_options, seed=options['seed']
+            )
+            results = suite.run()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        output_file = suite.save(results, options['output'])
+        self.stdout.write(self.style.SUCCESS(
+            f"✔ {scale} {file_format} benchmark (source generated in {results['generate_seconds']:.2f}s):"
+        ))
+        for scenario, result in results['scenarios'].items():
+            stats = result.get('stats')
+            if stats:
+                line = (f"{stats['seconds']:.2f}s, {stats['rows']} rows, {stats['rows_per_second'] or 0:.0f} rows/s, "
+                        f"{stats['queries']} queries")
+                if result['failures']:
+                    line += f", {result['failures']} failures"
+            else:
+                line = f"{result['seconds']:.2f}s"
+            self.stdout.write(f"  - {scenario}: {line}")
+        self.stdout.write(self.style.SUCCESS(f"✔ Results saved to {output_file}"))
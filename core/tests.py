@@ -1,3 +1,820 @@
-from django.test import TestCase
+import io
+import os
+import re
+import tempfile
+import threading
+import zipfile
+from itertools import count
+from pathlib import Path
+from unittest import mock, skipIf
+from django.apps import apps
+from django.core.management import call_command
+from django.db import connection, connections, models, transaction
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, isolate_apps
+from openpyxl import load_workbook
+from core.benchmarks.workbook_generator import SyntheticWorkbookGenerator
+from core.models import AccountType, FinancialData, FiscalQuarter, Measure
+from import_export.models import ImportJob
+from import_export.services.async_import import AsyncImportWorkbook
+from import_export.services.bulk_upsert import BulkUpsertWriter
+from import_export.services.import_jobs import run_import_job
+from import_export.services.import_template_builder import ImportTemplateBuilder
+from import_export.services.import_workbook import ImportWorkbook, get_default_state_path
+from import_export.services.model_scheduler import ModelScheduler
+from import_export.services.readers import XlsxReader, pa
+from import_export.services.row_pipeline import RowPipeline
+from import_export.utils.import_state import ImportStateStore
+from import_export.utils.import_stats import ImportStats
+from import_export.utils.mp_node_helpers import MPNodeBulkLoader
+from import_export.utils.sqlite_bulk_load import SQLiteBulkLoadSession
 
-# Create your tests here.
+SAMPLE_WORKBOOK = Path(__file__).resolve().parent / 'media' / 'import_export' / 'import_files' / 'core_import_file.xlsx'
+# Rows per sheet of the sample workbook
+SAMPLE_ROWS = {
+    'Measure': 4, 'FiscalQuarter': 5, 'FiscalYear': 2, 'AccountType': 9, 'Period': 14, 'FiscalYearPeriod': 28,
+    'PeriodMonth': 14, 'Organisation': 12, 'Account': 43, 'Project': 68, 'FinancialData': 276,
+}
+
+
+def get_counts(results):
+    # {model_name: (created, updated)} from the import's summary lines
+    counts = {}
+    for line in results['successes']:
+        match = re.match(r"Model name: (\w+): (\d+) created, (\d+) updated", line)
+        if match:
+            counts[match[1]] = (int(match[2]), int(match[3]))
+    return counts
+
+
+def dump_core():
+    out = io.StringIO()
+    call_command('dumpdata', 'core', stdout=out)
+    return out.getvalue()
+
+
+def get_core_rows():
+    # The app's rows with related rows given by natural key, so rows created in another order (and so with
+    # other pks) still compare equal
+    def get_value(value):
+        if isinstance(value, models.Model):
+            return get_value(value.natural_key())
+        if isinstance(value, (list, tuple)):
+            return tuple(get_value(item) for item in value)
+        return value
+
+    rows = []
+    for model in apps.get_app_config('core').get_models():
+        fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+        for obj in model._default_manager.all():
+            rows.append((model.__name__,) + tuple(get_value(getattr(obj, field.name)) for field in fields))
+    return sorted(rows, key=repr)
+
+
+def dump_core_after(import_workbook):
+    # The app's data after import_workbook() runs on the current database, which is then rolled back
+    with transaction.atomic():
+        import_workbook()
+        dump = dump_core()
+        transaction.set_rollback(True)
+    return dump
+
+
+class TempDirMixin:
+    # A temporary directory per test, as self.tmp_path, for state files, sources and exports
+    def setUp(self):
+        super().setUp()
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_path = Path(tmp_dir.name)
+
+
+class ImportQueryBudgetTests(TestCase):
+    def test_bulk_import_stays_within_query_budget(self):
+        # Bulk imports resolve keys once per model and write in batches; per-row queries are a regression
+        results = ImportWorkbook(
+            SAMPLE_WORKBOOK, 'core', bulk=True, query_budget=1, on_query_budget='raise'
+        ).import_workbook()
+        self.assertEqual(results['failures'], [])
+
+    def test_query_budget_reports_converter(self):
+        # Row by row, every MP_Node parent is looked up with get_by_natural_key()
+        with self.assertWarnsRegex(RuntimeWarning, r"Model name: Account: .*mp parent: \d+"):
+            ImportWorkbook(SAMPLE_WORKBOOK, 'core', query_budget=1).import_workbook()
+
+
+class ImportStatsTests(TestCase):
+    def test_progress_queries_are_not_counted(self):
+        def store_progress(event, data):
+            AccountType.objects.exists()
+
+        stats = ImportStats(callbacks=[store_progress])
+        with stats:
+            with stats.sheet('AccountType'):
+                AccountType.objects.count()
+        self.assertEqual(stats.sheets['AccountType']['queries'], 1)
+        self.assertEqual(stats.as_dict()['queries'], 1)
+
+
+class AsyncImportWorkbookTests(TransactionTestCase):
+    # The import runs on its own thread and connection, so its commits have to be visible to the test
+    async def collect_events(self, importer):
+        return [(event, data) async for event, data in importer]
+
+    async def test_events_follow_each_sheet_in_order(self):
+        importer = AsyncImportWorkbook(SAMPLE_WORKBOOK, 'core', bulk=True, batch_size=100)
+        events = await self.collect_events(importer)
+
+        self.assertEqual([event for event, _ in events[-2:]], ['import', 'finished'])
+        self.assertEqual(events[-1][1], importer.results)
+        self.assertEqual(importer.results['failures'], [])
+        model_names = [data['model'] for event, data in events if event == 'sheet_started']
+        self.assertCountEqual(model_names, SAMPLE_ROWS)
+        expected = []
+        for model_name in model_names:
+            rows_events = [('rows', model_name)] * (SAMPLE_ROWS[model_name] // 100)
+            expected += [('sheet_started', model_name), *rows_events, ('chunk', model_name), ('sheet', model_name)]
+        self.assertEqual([(event, data['model']) for event, data in events[:-2]], expected)
+        self.assertEqual(await FinancialData.objects.acount(), SAMPLE_ROWS['FinancialData'])
+
+    async def test_cancelled_import_rolls_back_its_sheet(self):
+        def cancel(event, data):
+            # Runs just before the import's own callback, which then raises ImportCancelled
+            if event == 'rows' and data['model'] == 'FinancialData':
+                importer.cancelled.set()
+
+        importer = AsyncImportWorkbook(
+            SAMPLE_WORKBOOK, 'core', bulk=True, batch_size=100, stats_callbacks=[cancel]
+        )
+        events = await self.collect_events(importer)
+
+        self.assertEqual(events[-1], ('finished', importer.results))
+        self.assertEqual(len(importer.results['failures']), 1)
+        self.assertTrue(importer.results['failures'][0].startswith("Model name: FinancialData – Import cancelled"))
+        self.assertNotIn(('chunk', 'FinancialData'), [(event, data.get('model')) for event, data in events[:-1]])
+        # Earlier sheets were committed before the cancellation, FinancialData's rows were rolled back
+        self.assertEqual(await FinancialData.objects.acount(), 0)
+        self.assertEqual(await Measure.objects.acount(), SAMPLE_ROWS['Measure'])
+
+
+class ModelSchedulerTests(SimpleTestCase):
+    def test_core_levels_follow_foreign_keys(self):
+        levels = ModelScheduler(apps.get_app_config('core').get_models()).get_levels()
+        level_of = {model.__name__: index for index, level in enumerate(levels) for model in level}
+        for parent in ('FiscalYearPeriod', 'Organisation', 'Account', 'Project'):
+            self.assertGreater(level_of['FinancialData'], level_of[parent])
+        self.assertGreater(level_of['Account'], level_of['AccountType'])
+        # Every foreign key points to an earlier level, apart from MP_Node parents in the same table
+        for index, level in enumerate(levels):
+            for model in level:
+                for field in model._meta.fields:
+                    if field.many_to_one and field.remote_field.model is not model:
+                        self.assertLess(level_of[field.remote_field.model.__name__], index, field)
+
+    @isolate_apps('core')
+    def test_self_references_are_not_dependencies(self):
+        class Node(models.Model):
+            parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True)
+
+        class Leaf(models.Model):
+            node = models.ForeignKey(Node, on_delete=models.CASCADE)
+
+        self.assertEqual(ModelScheduler([Leaf, Node]).get_levels(), [[Node], [Leaf]])
+
+    @isolate_apps('core')
+    def test_circular_foreign_keys_raise(self):
+        class Root(models.Model):
+            pass
+
+        class First(models.Model):
+            root = models.ForeignKey(Root, on_delete=models.CASCADE)
+            second = models.ForeignKey('Second', on_delete=models.CASCADE)
+
+        class Second(models.Model):
+            first = models.ForeignKey(First, on_delete=models.CASCADE)
+
+        with self.assertRaisesMessage(ValueError, 'Circular foreign key dependency between models: First, Second'):
+            ModelScheduler([Root, First, Second]).get_levels()
+
+
+class MPNodeBulkLoaderTests(TestCase):
+    def setUp(self):
+        root = AccountType.add_root(code=100, name='Root', operator=1)
+        for code in (110, 120, 130, 140, 150, 160):
+            root.add_child(code=code, name=f'Type {code}', operator=1)
+        # Leaves steps 1, 2, 5 and 6 under the root. The core managers aren't treebeard managers, so the
+        # nodes are deleted directly
+        AccountType.objects.filter(code__in=[130, 140]).delete()
+        AccountType.objects.filter(code=100).update(numchild=F('numchild') - 2)
+
+    def test_sorted_inserts_match_add_child_on_trees_with_gaps(self):
+        new_codes = [115, 125, 105, 170]
+        with transaction.atomic():
+            root = AccountType.objects.get(code=100)
+            for code in new_codes:
+                root.add_child(code=code, name=f'Type {code}', operator=1)
+                root.refresh_from_db()
+            expected = dict(AccountType.objects.values_list('code', 'path'))
+            transaction.set_rollback(True)
+
+        loader = MPNodeBulkLoader(AccountType, ['code'])
+        for code in new_codes:
+            loader.add(None, {'code': code, 'name': f'Type {code}', 'operator': 1, 'parent': 100})
+        loader.flush()
+        self.assertEqual(dict(AccountType.objects.values_list('code', 'path')), expected)
+
+
+class SkipUnchangedSheetsTests(TempDirMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.state_path = self.tmp_path / 'state.json'
+        # Both workbooks are freshly loaded and saved by openpyxl, so their unchanged sheets serialize identically
+        self.workbook = self.tmp_path / 'unchanged.xlsx'
+        load_workbook(SAMPLE_WORKBOOK).save(self.workbook)
+        wb = load_workbook(SAMPLE_WORKBOOK)
+        wb['FinancialData']['G4'] = 123456
+        self.changed_workbook = self.tmp_path / 'changed.xlsx'
+        wb.save(self.changed_workbook)
+
+    def import_workbook(self, path, **options):
+        options.setdefault('skip_unchanged', True)
+        results = ImportWorkbook(
+            path, 'core', read_only=True, bulk=True, state_path=self.state_path, **options
+        ).import_workbook()
+        self.assertEqual(results['failures'], [])
+        return [line for line in results['successes'] if line.endswith('unchanged since the last import, skipped')]
+
+    def test_reimport_skips_every_unchanged_sheet(self):
+        self.assertEqual(self.import_workbook(self.workbook), [])
+        skipped = self.import_workbook(self.workbook)
+        self.assertEqual(len(skipped), 11)
+
+    def test_read_only_fingerprints_ignore_other_sheets_edits(self):
+        # As when Excel saves new text in one sheet: a string is added to the shared string table, which
+        # renumbers the strings of every sheet, and a FinancialData cell changes
+        path = self.tmp_path / 'edited.xlsx'
+        reader = XlsxReader(SAMPLE_WORKBOOK, read_only=True)
+        before = {model_name: reader.get_sheet_fingerprint(model_name) for model_name in SAMPLE_ROWS}
+        financial_data_part = reader.workbook['FinancialData']._worksheet_path
+        reader.close()
+
+        def shift_index(match):
+            return match[1] + str(int(match[2]) + 1).encode() + match[3]
+
+        with zipfile.ZipFile(SAMPLE_WORKBOOK) as source, zipfile.ZipFile(path, 'w') as target:
+            for item in source.infolist():
+                data = source.read(item)
+                if item.filename == 'xl/sharedStrings.xml':
+                    data = re.sub(rb'(<sst[^>]*>)', rb'\1<si><t>New label</t></si>', data, count=1)
+                elif item.filename.startswith('xl/worksheets/sheet'):
+                    data = re.sub(rb'(<c [^>]*t="s"[^>]*><v>)(\d+)(</v>)', shift_index, data)
+                    if item.filename == financial_data_part:
+                        data = re.sub(rb'(<c r="G4"[^>]*><v>)[^<]*(</v>)', rb'\g<1>123456\2', data)
+                target.writestr(item, data)
+
+        reader = XlsxReader(path, read_only=True)
+        after = {model_name: reader.get_sheet_fingerprint(model_name) for model_name in SAMPLE_ROWS}
+        self.assertEqual(reader.read_sheet('Measure')[0], ['name'])
+        reader.close()
+        self.assertNotEqual(after.pop('FinancialData'), before.pop('FinancialData'))
+        self.assertEqual(after, before)
+
+    def test_changed_sheet_is_reimported(self):
+        self.import_workbook(self.workbook)
+        skipped = self.import_workbook(self.changed_workbook)
+        self.assertEqual(len(skipped), 10)
+        self.assertFalse(any(line.startswith('Model name: FinancialData:') for line in skipped))
+        self.assertTrue(FinancialData.objects.filter(actual=123456).exists())
+
+    def test_skip_unchanged_off_imports_every_sheet(self):
+        self.import_workbook(self.workbook)
+        self.assertEqual(self.import_workbook(self.workbook, skip_unchanged=False), [])
+
+    def test_emptied_table_is_reimported(self):
+        # A matching fingerprint isn't enough once the rows are gone, e.g. after a database reset
+        self.import_workbook(self.workbook)
+        FinancialData.objects.all().delete()
+        skipped = self.import_workbook(self.workbook)
+        self.assertEqual(len(skipped), 10)
+        self.assertEqual(FinancialData.objects.count(), 276)
+
+    def test_fingerprints_are_kept_per_database(self):
+        self.import_workbook(self.workbook)
+        with mock.patch.dict('django.db.connection.settings_dict', {'NAME': 'other'}):
+            self.assertEqual(self.import_workbook(self.workbook), [])
+
+    def test_force_disables_skipping(self):
+        path = 'import_export.management.commands.import_workbook.ImportWorkbook'
+        with mock.patch(path) as import_workbook:
+            import_workbook.return_value.import_workbook.return_value = {'successes': [], 'failures': []}
+            call_command('import_workbook', 'core', '--source', str(self.workbook), '--force', stdout=io.StringIO())
+        self.assertFalse(import_workbook.call_args.kwargs['skip_unchanged'])
+
+
+class ImportJobTests(TestCase):
+    def test_enqueue_stores_absolute_paths(self):
+        call_command('import_workbook', 'core', '--source', os.path.relpath(SAMPLE_WORKBOOK),
+                     '--bulk', '--enqueue', stdout=io.StringIO())
+        job = ImportJob.objects.get()
+        self.assertEqual(job.status, ImportJob.Status.QUEUED)
+        self.assertEqual(job.source, str(SAMPLE_WORKBOOK))
+        self.assertEqual(job.options['state_path'], str(get_default_state_path('core').resolve()))
+        self.assertTrue(job.options['bulk'])
+
+    def test_claim_runs_one_job_per_app_in_order(self):
+        first = ImportJob.objects.enqueue(SAMPLE_WORKBOOK, 'core')
+        second = ImportJob.objects.enqueue(SAMPLE_WORKBOOK, 'core')
+        other = ImportJob.objects.enqueue(SAMPLE_WORKBOOK, 'other')
+
+        self.assertEqual(ImportJob.objects.claim_next('worker-1'), first)
+        # 'core' already has a running job, so its next job waits
+        self.assertEqual(ImportJob.objects.claim_next('worker-2'), other)
+        self.assertIsNone(ImportJob.objects.claim_next('worker-2'))
+
+        ImportJob.objects.filter(pk=first.pk).update(status=ImportJob.Status.SUCCEEDED)
+        claimed = ImportJob.objects.claim_next('worker-2')
+        self.assertEqual(claimed, second)
+        self.assertEqual((claimed.status, claimed.worker), (ImportJob.Status.RUNNING, 'worker-2'))
+        self.assertIsNotNone(claimed.started_at)
+
+    def test_run_import_job_records_status_and_progress(self):
+        job = ImportJob.objects.enqueue(SAMPLE_WORKBOOK, 'core', bulk=True)
+        # Job processes close their connections when done, which would end the test's transaction
+        with mock.patch.object(connections, 'close_all'):
+            run_import_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.Status.SUCCEEDED)
+        self.assertEqual(job.results['failures'], [])
+        self.assertEqual(job.sheets_done, 11)
+        self.assertEqual(job.rows_committed, job.results['stats']['rows'])
+        self.assertEqual(job.current_sheet, '')
+        self.assertIsNotNone(job.finished_at)
+
+    def test_failed_job_records_error(self):
+        job = ImportJob.objects.enqueue(SAMPLE_WORKBOOK, 'core', on_query_budget='ignore')
+        with mock.patch.object(connections, 'close_all'):
+            run_import_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.Status.FAILED)
+        self.assertIn("on_query_budget must be 'warn' or 'raise'", job.error)
+
+class DeferredIndexesTests(TempDirMixin, TransactionTestCase):
+    # Sessions must start outside a transaction, and the test database's pragmas are left alone
+    def setUp(self):
+        super().setUp()
+        self.state_path = self.tmp_path / 'state.json'
+
+    def start_session(self, models=(), defer_indexes=False):
+        session = SQLiteBulkLoadSession(
+            models, journal_mode=None, synchronous=None, cache_size=None, defer_indexes=defer_indexes,
+            state_store=ImportStateStore(self.state_path)
+        )
+        session.start()
+        return session
+
+    def get_index_names(self):
+        with connection.cursor() as cursor:
+            return {name for name, _ in SQLiteBulkLoadSession([FinancialData]).get_deferrable_indexes(cursor)}
+
+    def test_dropped_indexes_are_saved_and_cleared(self):
+        index_names = self.get_index_names()
+        self.assertTrue(index_names)
+        session = self.start_session([FinancialData], defer_indexes=True)
+        self.assertEqual(self.get_index_names(), set())
+        saved = ImportStateStore(self.state_path).get_deferred_indexes(session.state_key)
+        self.assertEqual({name for name, _ in saved}, index_names)
+
+        session.finish()
+        self.assertEqual(self.get_index_names(), index_names)
+        self.assertEqual(ImportStateStore(self.state_path).get_deferred_indexes(session.state_key), [])
+
+    def test_next_session_restores_indexes_of_a_killed_run(self):
+        index_names = self.get_index_names()
+        # The first session is never finished, as if its process had been killed
+        self.start_session([FinancialData], defer_indexes=True)
+        self.assertEqual(self.get_index_names(), set())
+
+        session = self.start_session()
+        self.assertEqual(self.get_index_names(), index_names)
+        session.finish()
+        self.assertEqual(ImportStateStore(self.state_path).get_deferred_indexes(session.state_key), [])
+
+
+class BulkImportTests(TestCase):
+    def test_bulk_import_counts_created_then_updated_rows(self):
+        results = ImportWorkbook(SAMPLE_WORKBOOK, 'core', bulk=True).import_workbook()
+        self.assertEqual(results['failures'], [])
+        self.assertEqual(get_counts(results), {model: (rows, 0) for model, rows in SAMPLE_ROWS.items()})
+
+        results = ImportWorkbook(SAMPLE_WORKBOOK, 'core', bulk=True).import_workbook()
+        self.assertEqual(results['failures'], [])
+        self.assertEqual(get_counts(results), {model: (0, rows) for model, rows in SAMPLE_ROWS.items()})
+
+    def test_bulk_import_matches_row_by_row_import(self):
+        expected = dump_core_after(lambda: ImportWorkbook(SAMPLE_WORKBOOK, 'core').import_workbook())
+        self.assertIn('"model": "core.financialdata"', expected)
+        self.assertFalse(FinancialData.objects.exists())
+        ImportWorkbook(SAMPLE_WORKBOOK, 'core', bulk=True).import_workbook()
+        self.assertEqual(dump_core(), expected)
+
+
+class ResumableImportTests(TempDirMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.state_path = self.tmp_path / 'state.json'
+
+    def import_workbook(self, **options):
+        return ImportWorkbook(
+            SAMPLE_WORKBOOK, 'core', bulk=True, chunk_size=100, state_path=self.state_path, **options
+        ).import_workbook()
+
+    def test_resume_after_mid_sheet_failure_commits_rows_once(self):
+        expected = dump_core_after(lambda: ImportWorkbook(SAMPLE_WORKBOOK, 'core', bulk=True).import_workbook())
+        flush = BulkUpsertWriter.flush
+        flushes = []
+
+        def fail_third_financial_data_chunk(writer):
+            if writer.model is FinancialData:
+                flushes.append(writer)
+                if len(flushes) == 3:
+                    raise RuntimeError('injected failure')
+            return flush(writer)
+
+        with mock.patch.object(BulkUpsertWriter, 'flush', fail_third_financial_data_chunk):
+            results = self.import_workbook()
+        self.assertEqual(len(results['failures']), 1)
+        self.assertIn('Model name: FinancialData – injected failure', results['failures'][0])
+        # The first two chunks were committed; the failed one was rolled back
+        self.assertEqual(FinancialData.objects.count(), 200)
+
+        results = self.import_workbook(resume=True)
+        self.assertEqual(results['failures'], [])
+        skipped = [line for line in results['successes'] if line.endswith('already committed, skipped on resume')]
+        self.assertEqual(len(skipped), 10)
+        self.assertEqual(get_counts(results), {'FinancialData': (76, 0)})
+        self.assertIn('(resumed after row', results['successes'][-1])
+        self.assertEqual(dump_core(), expected)
+        # Nothing is left to resume once the import completes
+        self.assertIsNone(ImportStateStore(self.state_path).state.get('checkpoint'))
+
+
+class DryRunTests(TempDirMixin, TestCase):
+    def dry_run(self, path=SAMPLE_WORKBOOK):
+        with CaptureQueriesContext(connection) as queries:
+            results = ImportWorkbook(path, 'core', dry_run=True).import_workbook()
+        writes = [query['sql'] for query in queries if not query['sql'].lstrip().upper().startswith('SELECT')]
+        self.assertEqual(writes, [])
+        return results
+
+    def get_dry_run_counts(self, results):
+        counts = {}
+        for line in results['successes']:
+            match = re.match(r"Model name: (\w+): (\d+) would be created, (\d+) would be updated", line)
+            counts[match[1]] = (int(match[2]), int(match[3]))
+        return counts
+
+    def test_dry_run_reports_counts_without_writing(self):
+        results = self.dry_run()
+        self.assertEqual(results['failures'], [])
+        self.assertEqual(self.get_dry_run_counts(results), {model: (rows, 0) for model, rows in SAMPLE_ROWS.items()})
+        self.assertEqual(dump_core(), '[]')
+
+        ImportWorkbook(SAMPLE_WORKBOOK, 'core', bulk=True).import_workbook()
+        expected = dump_core()
+        results = self.dry_run()
+        self.assertEqual(self.get_dry_run_counts(results), {model: (0, rows) for model, rows in SAMPLE_ROWS.items()})
+        self.assertEqual(dump_core(), expected)
+
+    def test_dry_run_groups_invalid_rows_per_error(self):
+        # A row with several errors counts towards each of them, rather than forming a group of its own
+        path = self.tmp_path / 'invalid.xlsx'
+        wb = load_workbook(SAMPLE_WORKBOOK)
+        for row in range(4, 11):
+            wb['FinancialData'][f'E{row}'] = 999999
+        wb['FinancialData']['F4'] = 888888
+        wb.save(path)
+
+        results = self.dry_run(path)
+        self.assertEqual(results['failures'], [
+            "Model name: FinancialData rows 4, 5, 6, 7, 8 and 2 more – Account with natural key [999999] not found. "
+            "(7 rows)",
+            "Model name: FinancialData row 4 – Project with natural key [888888] not found.",
+        ])
+
+    def test_dry_run_reports_invalid_rows(self):
+        path = self.tmp_path / 'invalid.xlsx'
+        wb = load_workbook(SAMPLE_WORKBOOK)
+        wb['FinancialData']['G4'] = 'abc'
+        wb['FinancialData']['E6'] = 999999
+        wb.save(path)
+
+        results = self.dry_run(path)
+        self.assertEqual(results['failures'], [
+            "Model name: FinancialData row 4 – Column 'actual' has an invalid value 'abc'",
+            "Model name: FinancialData row 6 – Account with natural key [999999] not found.",
+        ])
+        self.assertIn(
+            "Model name: FinancialData: 274 would be created, 0 would be updated, 2 invalid rows", results['successes']
+        )
+        self.assertEqual(dump_core(), '[]')
+
+
+class SourceFormatTests(TempDirMixin, TestCase):
+    # Small enough to import every format quickly, with trees three levels deep
+    SCALE = {'fiscal_years': 1, 'organisation': (3, 2), 'account': (3, 2), 'project': (3, 2), 'financial_data': 200}
+
+    def setUp(self):
+        super().setUp()
+        self.workbook = self.write_source('xlsx', self.tmp_path / 'source.xlsx')
+        self.expected = dump_core_after(lambda: self.import_source(self.workbook))
+        self.assertIn('"model": "core.financialdata"', self.expected)
+
+    def write_source(self, file_format, path):
+        # A fresh generator per source, so every format holds the same rows
+        return SyntheticWorkbookGenerator(scale=self.SCALE).write(path, file_format)
+
+    def import_source(self, source, **options):
+        results = ImportWorkbook(source, 'core', bulk=True, **options).import_workbook()
+        self.assertEqual(results['failures'], [])
+        return results
+
+    def assertImportsLikeWorkbook(self, import_source):
+        self.assertEqual(dump_core_after(import_source), self.expected)
+
+    def test_csv_directory(self):
+        source = self.write_source('csv', self.tmp_path / 'csv')
+        self.assertImportsLikeWorkbook(lambda: self.import_source(source))
+
+    def test_jsonl_directory(self):
+        source = self.write_source('jsonl', self.tmp_path / 'jsonl')
+        self.assertImportsLikeWorkbook(lambda: self.import_source(source))
+
+    @skipIf(pa is None, 'pyarrow is not installed')
+    def test_parquet_directory(self):
+        source = self.write_source('parquet', self.tmp_path / 'parquet')
+        self.assertImportsLikeWorkbook(lambda: self.import_source(source))
+
+    def test_read_only_workbook(self):
+        self.assertImportsLikeWorkbook(lambda: self.import_source(self.workbook, read_only=True))
+
+    def test_workbook_buffer(self):
+        self.assertImportsLikeWorkbook(lambda: self.import_source(io.BytesIO(self.workbook.read_bytes())))
+
+    def test_csv_buffers(self):
+        source = self.write_source('csv', self.tmp_path / 'csv')
+
+        def import_buffers():
+            # One buffer per model, parents first, each named after its model
+            for model in ModelScheduler(apps.get_app_config('core').get_models()).get_ordered_models():
+                path = source / f"{model.__name__}.csv"
+                self.import_source(io.BytesIO(path.read_bytes()), source_name=path.name)
+
+        self.assertImportsLikeWorkbook(import_buffers)
+
+
+def describe_workbook(path):
+    # Everything an import or a user filling in the template relies on, with no styling
+    wb = load_workbook(path)
+    return {
+        'defined_names': {name: defined_name.attr_text for name, defined_name in wb.defined_names.items()},
+        'sheets': {
+            ws.title: {
+                'tables': {
+                    table.name: (table.ref, [column.name for column in table.tableColumns])
+                    for table in ws.tables.values()
+                },
+                'validations': sorted(
+                    (str(dv.sqref), dv.type, dv.formula1, dv.allow_blank) for dv in ws.data_validations.dataValidation
+                ),
+                'values': list(ws.iter_rows(values_only=True)),
+            }
+            for ws in wb
+        },
+    }
+
+
+class WriteOnlyTemplateTests(TempDirMixin, TestCase):
+    def build(self, name, **options):
+        path = self.tmp_path / f"{name}.xlsx"
+        ImportTemplateBuilder('core', **options).build_workbook().save(path)
+        return describe_workbook(path)
+
+    def test_write_only_template_matches_normal_build(self):
+        expected = self.build('normal')
+        self.assertTrue(expected['defined_names'])
+        self.assertTrue(any(sheet['validations'] for sheet in expected['sheets'].values()))
+        self.assertEqual(self.build('write_only', write_only=True), expected)
+
+    def test_write_only_export_matches_normal_build(self):
+        ImportWorkbook(SAMPLE_WORKBOOK, 'core', bulk=True).import_workbook()
+        expected = self.build('normal', with_data=True)
+        self.assertEqual(len(expected['sheets']['FinancialData']['values']), 3 + SAMPLE_ROWS['FinancialData'])
+        self.assertEqual(self.build('write_only', write_only=True, with_data=True, chunk_size=100), expected)
+
+
+class ExportWithDataTests(TempDirMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.export_path = self.tmp_path / 'export.xlsx'
+
+    def import_and_export(self, **options):
+        ImportWorkbook(SAMPLE_WORKBOOK, 'core', bulk=True).import_workbook()
+        ImportTemplateBuilder('core', with_data=True, **options).build_workbook().save(self.export_path)
+
+    def test_export_reimports_to_identical_database(self):
+        # The sample's data is exported, then rolled back so the export is imported into an empty database.
+        # Trees are exported in path order, so their rows are compared by natural key rather than pk
+        with transaction.atomic():
+            self.import_and_export()
+            expected = get_core_rows()
+            transaction.set_rollback(True)
+        self.assertEqual(len(expected), sum(SAMPLE_ROWS.values()))
+        self.assertFalse(FinancialData.objects.exists())
+
+        results = ImportWorkbook(self.export_path, 'core').import_workbook()
+        self.assertEqual(results['failures'], [])
+        self.assertEqual(get_counts(results), {model: (rows, 0) for model, rows in SAMPLE_ROWS.items()})
+        self.assertEqual(get_core_rows(), expected)
+
+    def test_write_only_export_reimports_unchanged(self):
+        self.import_and_export(write_only=True)
+        expected = dump_core()
+
+        results = ImportWorkbook(self.export_path, 'core', bulk=True, delta=True).import_workbook()
+        self.assertEqual(results['failures'], [])
+        unchanged = [line for line in results['successes'] if line.endswith(' unchanged')]
+        for line in unchanged:
+            self.assertRegex(line, r": 0 created, 0 updated, \d+ unchanged$")
+        self.assertTrue(unchanged)
+        self.assertEqual(dump_core(), expected)
+
+
+class ParallelImportTests(TempDirMixin, TransactionTestCase):
+    # Worker processes can't open the in-memory test database, so these tests import into a database file
+    def setUp(self):
+        super().setUp()
+        settings_dict = connection.settings_dict
+        memory_name = settings_dict['NAME']
+        # Closing the in-memory database would drop it, so it's only set aside until the test is done
+        memory_connection = connection.connection
+        connection.connection = None
+        settings_dict['NAME'] = str(self.tmp_path / 'db.sqlite3')
+
+        def restore():
+            connection.close()
+            settings_dict['NAME'] = memory_name
+            connection.connection = memory_connection
+
+        self.addCleanup(restore)
+        call_command('migrate', verbosity=0)
+
+    def test_workers_import_the_same_rows_as_a_sequential_import(self):
+        for options in ({}, {'bulk': True}):
+            with self.subTest(**options):
+                results = ImportWorkbook(SAMPLE_WORKBOOK, 'core', **options).import_workbook()
+                self.assertEqual(results['failures'], [])
+                rows = get_core_rows()
+                call_command('flush', interactive=False, verbosity=0)
+
+                results = ImportWorkbook(SAMPLE_WORKBOOK, 'core', workers=2, **options).import_workbook()
+                self.assertEqual(results['failures'], [])
+                self.assertEqual(get_counts(results), {model_name: (rows, 0) for model_name, rows in SAMPLE_ROWS.items()})
+                self.assertEqual(get_core_rows(), rows)
+                call_command('flush', interactive=False, verbosity=0)
+
+    def test_worker_reports_every_invalid_row_before_writing(self):
+        path = self.tmp_path / 'invalid.xlsx'
+        wb = load_workbook(SAMPLE_WORKBOOK)
+        wb['FinancialData']['E4'] = 999999
+        wb['FinancialData']['G50'] = 'abc'
+        wb.save(path)
+
+        results = ImportWorkbook(path, 'core', workers=2, bulk=True).import_workbook()
+        self.assertEqual(len(results['failures']), 1)
+        self.assertTrue(results['failures'][0].startswith(
+            "Model name: FinancialData – 2 invalid rows\n"
+            "row 4 – Account with natural key [999999] not found.\n"
+            "row 50 – Column 'actual' has an invalid value 'abc'\n"
+        ))
+        self.assertFalse(FinancialData.objects.exists())
+        self.assertEqual(Measure.objects.count(), SAMPLE_ROWS['Measure'])
+
+    def test_workers_refuse_to_run_inside_a_transaction(self):
+        with transaction.atomic():
+            results = ImportWorkbook(SAMPLE_WORKBOOK, 'core', workers=2).import_workbook()
+            # The enclosing transaction's connection is still open
+            self.assertFalse(Measure.objects.exists())
+        self.assertEqual(len(results['failures']), 1)
+        self.assertIn("Parallel workers can't be used inside a transaction (atomic block).", results['failures'][0])
+
+
+class SelectedModelsTests(TempDirMixin, TestCase):
+    def import_workbook(self, source=SAMPLE_WORKBOOK, **options):
+        with mock.patch.object(XlsxReader, 'close', autospec=True, side_effect=XlsxReader.close) as close:
+            results = ImportWorkbook(source, 'core', bulk=True, **options).import_workbook()
+        # The reader is closed whether or not the import could start
+        close.assert_called_once()
+        return results
+
+    def test_partial_import_only_imports_selected_models(self):
+        results = self.import_workbook(models=['Measure', 'FiscalQuarter'])
+        self.assertEqual(results['failures'], [])
+        self.assertEqual(get_counts(results), {'Measure': (4, 0), 'FiscalQuarter': (5, 0)})
+        self.assertFalse(AccountType.objects.exists())
+
+    def test_partial_import_on_top_of_a_full_import(self):
+        self.import_workbook()
+        results = self.import_workbook(models=['FinancialData'])
+        self.assertEqual(results['failures'], [])
+        self.assertEqual(get_counts(results), {'FinancialData': (0, 276)})
+
+    def test_model_option_accepts_comma_separated_names(self):
+        call_command('import_workbook', 'core', '--source', str(SAMPLE_WORKBOOK), '--model', 'Measure, FiscalQuarter',
+                     '--force', stdout=io.StringIO())
+        self.assertEqual(FiscalQuarter.objects.count(), 5)
+        self.assertFalse(AccountType.objects.exists())
+
+    def test_unknown_model_is_reported(self):
+        results = self.import_workbook(models=['Measure', 'Unknown'])
+        self.assertEqual(len(results['failures']), 1)
+        self.assertIn("App 'core' has no model named 'Unknown'.", results['failures'][0])
+        self.assertFalse(Measure.objects.exists())
+
+    def test_model_missing_from_source_is_reported(self):
+        path = self.tmp_path / 'no_measure.xlsx'
+        wb = load_workbook(SAMPLE_WORKBOOK)
+        del wb['Measure']
+        wb.save(path)
+        results = self.import_workbook(path, models=['Measure'])
+        self.assertEqual(len(results['failures']), 1)
+        self.assertIn("The source has no sheet for model 'Measure'.", results['failures'][0])
+
+    def test_invalid_options_are_reported(self):
+        results = self.import_workbook(workers=2, chunk_size=10, read_only=True)
+        self.assertEqual(len(results['failures']), 1)
+        self.assertIn("can't be combined with parallel workers", results['failures'][0])
+
+
+class InvalidRowsTests(TempDirMixin, TestCase):
+    def test_import_reports_every_invalid_row_of_the_sheet(self):
+        path = self.tmp_path / 'invalid.xlsx'
+        wb = load_workbook(SAMPLE_WORKBOOK)
+        for row in range(4, 40):
+            wb['FinancialData'][f'E{row}'] = 999999
+        wb['FinancialData']['G50'] = 'abc'
+        wb.save(path)
+
+        for options in ({}, {'bulk': True}, {'bulk': True, 'pipeline': True}):
+            with self.subTest(**options):
+                results = ImportWorkbook(path, 'core', **options).import_workbook()
+                self.assertEqual(len(results['failures']), 1)
+                self.assertTrue(results['failures'][0].startswith(
+                    "Model name: FinancialData – 37 invalid rows\n"
+                    "rows 4, 5, 6, 7, 8 and 31 more – Account with natural key [999999] not found. (36 rows)\n"
+                    "row 50 – Column 'actual' has an invalid value 'abc'\n"
+                ))
+                # The sheet is rolled back as a whole
+                self.assertFalse(FinancialData.objects.exists())
+
+
+class RowPipelineTests(TestCase):
+    def test_rows_keep_sheet_order(self):
+        numbered_rows = [(row_number, [row_number]) for row_number in range(2, 1002)]
+        pipeline = RowPipeline(iter(numbered_rows), decode=lambda values: values[0] * 2, batch_size=7, queue_size=2)
+        self.assertEqual(list(pipeline), [(row_number, row_number * 2) for row_number in range(2, 1002)])
+
+    def test_decode_error_rolls_back_the_transaction(self):
+        def decode(values):
+            if values[0] == 'bad':
+                raise ValueError("Bad row")
+            return {'name': values[0]}
+
+        numbered_rows = iter([(2, ['Actual']), (3, ['Budget']), (4, ['bad']), (5, ['Forecast'])])
+        written = []
+        with self.assertRaisesMessage(ValueError, "Bad row"):
+            with transaction.atomic():
+                for row_number, data in RowPipeline(numbered_rows, decode=decode, batch_size=10):
+                    Measure.objects.create(**data)
+                    written.append(row_number)
+        # Rows before the failing one were written, then rolled back with it
+        self.assertEqual(written, [2, 3])
+        self.assertFalse(Measure.objects.exists())
+
+    def test_producer_is_joined_when_the_consumer_stops(self):
+        producers = []
+
+        def numbered_rows():
+            producers.append(threading.current_thread())
+            for row_number in count(2):
+                yield row_number, [row_number]
+
+        # An endless sheet, so the producer is blocked on the full queue when iteration stops
+        pipeline = RowPipeline(numbered_rows(), batch_size=1, queue_size=1)
+        rows = iter(pipeline)
+        self.assertEqual([next(rows) for _ in range(3)], [(2, [2]), (3, [3]), (4, [4])])
+        rows.close()
+        self.assertTrue(pipeline.stopped.is_set())
+        self.assertEqual(len(producers), 1)
+        self.assertIsNot(producers[0], threading.current_thread())
+        self.assertFalse(producers[0].is_alive())
@@ -0,0 +1,13 @@
+from django.contrib import admin
+from .models import ImportJob
+
+
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ['pk', 'app_label', 'source', 'status', 'current_sheet', 'sheets_done', 'rows_committed',
+                    'created_at', 'started_at', 'finished_at']
+    list_filter = ['status', 'app_label']
+    readonly_fields = ['worker', 'current_sheet', 'sheets_done', 'rows_committed', 'created_at', 'started_at',
+                       'finished_at', 'results', 'error']
+
+
+admin.site.register(ImportJob, ImportJobAdmin)
@@ -10,6 +10,17 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument('app_name', type=str, help='create import template for this app')
+        parser.add_argument(
+            '--write-only', action='store_true',
+            help='stream each sheet to disk as it is built instead of holding the whole workbook in memory'
+        )
+        parser.add_argument(
+            '--with-data', action='store_true',
+            help="fill each table with the model's existing rows so they can be edited and imported back"
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000, help='rows fetched from the database at a time with --with-data'
+        )
 
     def handle(self, *args, **options):
         app_name = options['app_name']
@@ -34,7 +45,9 @@ class Command(BaseCommand):
             output_file.unlink()
 
         # Build the workbook
-        builder = ImportTemplateBuilder(app_name)
+        builder = ImportTemplateBuilder(
+            app_name, write_only=options['write_only'], with_data=options['with_data'], chunk_size=options['chunk_size']
+        )
         workbook = builder.build_workbook()
         workbook.save(output_file)
 
@@ -1,26 +1,92 @@
 from pathlib import Path
 from django.core.management.base import BaseCommand
-from import_export.services.import_workbook import ImportWorkbook
+from import_export.models import ImportJob
+from import_export.services.import_workbook import ImportWorkbook, get_default_state_path
 
 class Command(BaseCommand):
     help = 'Imports data from an Excel workbook into Django models.'
 
     def add_arguments(self, parser):
         parser.add_argument('app_label', type=str, help='Specify the app')
-        parser.add_argument('--model', type=str, help='Optional: only import data for a specific model within the app')
-        # model will fail if relies on choice_maps picked pu from earlier models, consider checking if choice map exists
-        # before processing and refactoring with a patch to check and create if necessary/
+        parser.add_argument('--model', action='append',
+                            help='Only import the sheet of this model (repeatable, or comma-separated); the rows '
+                                 'it refers to must already be in the database')
+        parser.add_argument('--source', type=str,
+                            help='Import from this .xlsx/.csv/.jsonl/.parquet file or directory of per-model '
+                                 'extracts instead of the app\'s import workbook')
+        parser.add_argument('--read-only', action='store_true',
+                            help='Stream rows from read-only worksheets to keep memory flat on large workbooks')
+        parser.add_argument('--bulk', action='store_true',
+                            help='Write rows in batches with bulk_create/bulk_update instead of update_or_create')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per batch in --bulk mode')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Import sheets with no dependency between them concurrently in this many processes')
+        parser.add_argument('--chunk-size', type=int,
+                            help='Commit every N rows and record a checkpoint instead of one transaction per sheet')
+        parser.add_argument('--resume', action='store_true',
+                            help='Skip sheets and chunks already committed by an interrupted run of the same workbook')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Validate the workbook and report would-create/would-update counts without writing')
+        parser.add_argument('--delta', action='store_true',
+                            help='Only write rows that are new or differ from the stored values')
+        parser.add_argument('--pipeline', action='store_true',
+                            help='Read and decode rows in a background thread while writing the previous batches')
+        parser.add_argument('--queue-size', type=int, default=4,
+                            help='Decoded batches the --pipeline reader may hold ahead of the writer')
+        parser.add_argument('--query-budget', type=float,
+                            help='Warn when a sheet issues more than this many queries per row')
+        parser.add_argument('--fail-on-query-budget', action='store_true',
+                            help='Fail the import instead of warning when a sheet exceeds --query-budget')
+        parser.add_argument('--stats', action='store_true',
+                            help='Print timings, query counts, rows/sec and peak memory per sheet and phase')
+        parser.add_argument('--sqlite-bulk-load', action='store_true',
+                            help='On SQLite, use WAL, relaxed synchronous and a larger page cache during the import')
+        parser.add_argument('--defer-indexes', action='store_true',
+                            help='With --sqlite-bulk-load, drop non-unique indexes on the imported tables and '
+                                 'rebuild them once the import finishes. They are saved to the state file first, '
+                                 'so if the process is killed the next bulk-load run recreates them')
+        parser.add_argument('--force', action='store_true',
+                            help='Import every sheet, even those unchanged since their last successful import')
+        parser.add_argument('--enqueue', action='store_true',
+                            help='Queue the import as a background job for run_import_jobs instead of running it')
     def handle(self, *args, **options):
 
-        model = options.get('model')
+        models = [name.strip() for value in options.get('model') or [] for name in value.split(',') if name.strip()]
         app_label = options.get('app_label')
+        read_only = options.get('read_only')
+        bulk = options.get('bulk')
+        batch_size = options.get('batch_size')
+        workers = options.get('workers')
+        chunk_size = options.get('chunk_size')
+        resume = options.get('resume')
+        dry_run = options.get('dry_run')
+        delta = options.get('delta')
+        source = options.get('source')
+        pipeline = options.get('pipeline')
+        queue_size = options.get('queue_size')
+        stats = options.get('stats')
+        query_budget = options.get('query_budget')
+        on_query_budget = 'raise' if options.get('fail_on_query_budget') else 'warn'
 
         base_dir = Path(app_label) / "media" / "import_export" / "import_files"
-        full_path = base_dir / f"{app_label}_import_file.xlsx"
+        full_path = Path(source) if source else base_dir / f"{app_label}_import_file.xlsx"
 
-        if Path(full_path).is_file():
+        import_options = dict(
+            read_only=read_only, bulk=bulk, batch_size=batch_size, workers=workers, chunk_size=chunk_size,
+            resume=resume, dry_run=dry_run, delta=delta, pipeline=pipeline, queue_size=queue_size,
+            trace_memory=stats, query_budget=query_budget, on_query_budget=on_query_budget,
+            sqlite_bulk_load=options.get('sqlite_bulk_load'), defer_indexes=options.get('defer_indexes'),
+            skip_unchanged=not options.get('force'), models=models
+        )
+
+        if full_path.exists() and options.get('enqueue'):
+            # Paths are stored absolute, so the worker doesn't depend on this command's working directory
+            import_options['state_path'] = str(get_default_state_path(app_label).resolve())
+            job = ImportJob.objects.enqueue(full_path.resolve(), app_label, **import_options)
+            self.stdout.write(self.style.SUCCESS(f"✔ Queued {job}"))
+        elif full_path.exists():
             try:
-                importer = ImportWorkbook(full_path, app_label)
+                importer = ImportWorkbook(full_path, app_label, **import_options)
                 result = importer.import_workbook()
                 if result["successes"] and result["failures"]:
                     self.stdout.write(self.style.SUCCESS("✔ Import Successes:"))
@@ -37,8 +103,36 @@ class Command(BaseCommand):
                     self.stdout.write(self.style.ERROR("⚠ Import Failed:"))
                     for line in result["failures"]:
                         self.stdout.write(self.style.ERROR(f"  - {line}"))
-            except:
-                self.stdout.write(self.style.ERROR("⚠ Import Failed:"))
+                if stats:
+                    self._write_stats(result["stats"])
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"⚠ Import Failed: {e}"))
 
         else:
             self.stdout.write(self.style.ERROR(f'File does not exist at {full_path}'))
+
+    def _write_stats(self, stats):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"📊 Import stats: {self._format_throughput(stats)}{self._format_memory(stats.get('peak_memory'))}"
+        ))
+        self.stdout.write(f"  Phases: {self._format_phases(stats['phases'])}")
+        for model_name, sheet in stats['sheets'].items():
+            self.stdout.write(
+                f"  - {model_name}: {self._format_throughput(sheet)}{self._format_memory(sheet.get('peak_memory'))}"
+            )
+            self.stdout.write(f"      {self._format_phases(sheet['phases'])}")
+
+    @staticmethod
+    def _format_throughput(stats):
+        rate = f" ({stats['rows_per_second']:.0f} rows/s)" if stats['rows_per_second'] else ""
+        return f"{stats['rows']} rows in {stats['seconds']:.2f}s{rate}, {stats['queries']} queries"
+
+    @staticmethod
+    def _format_memory(peak_memory):
+        return f", peak memory {peak_memory / (1024 * 1024):.1f} MiB" if peak_memory is not None else ""
+
+    @staticmethod
+    def _format_phases(phases):
+        return ", ".join(
+            f"{name} {phase['seconds']:.3f}s/{phase['queries']}q" for name, phase in phases.items()
+        )
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from import_export.services.import_jobs import ImportJobRunner
+
+
+class Command(BaseCommand):
+    help = 'Runs queued import jobs in background worker processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help='Jobs run at the same time; jobs for the same app always run one at a time')
+        parser.add_argument('--poll-interval', type=float, default=2, help='Seconds between checks for new jobs')
+        parser.add_argument('--name', type=str, help='Worker name recorded on the jobs it runs')
+        parser.add_argument('--burst', action='store_true', help='Exit once the queue is empty')
+        parser.add_argument('--max-jobs', type=int, help='Exit after starting this many jobs')
+        parser.add_argument('--reset-running', action='store_true',
+                            help='Mark jobs left running by a stopped worker as failed before starting')
+
+    def handle(self, *args, **options):
+        runner = ImportJobRunner(
+            concurrency=options['concurrency'], poll_interval=options['poll_interval'], name=options.get('name')
+        )
+        if options['reset_running']:
+            reset_count = runner.reset_running()
+            if reset_count:
+                self.stdout.write(self.style.WARNING(f"⚠ {reset_count} interrupted jobs marked as failed"))
+
+        self.stdout.write(self.style.SUCCESS(f"✔ Import worker {runner.name} started"))
+        try:
+            job_count = runner.run(burst=options['burst'], max_jobs=options.get('max_jobs'))
+        except KeyboardInterrupt:
+            # The job processes are interrupted too; their jobs would otherwise stay running and block their apps
+            runner.reset_running(worker=runner.name)
+            self.stdout.write(self.style.WARNING("⚠ Import worker stopped"))
+            return
+        self.stdout.write(self.style.SUCCESS(f"✔ Import worker finished after {job_count} jobs"))
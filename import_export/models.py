@@ -0,0 +1,66 @@
+from django.db import models, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+
+class ImportJobManager(models.Manager):
+    def enqueue(self, source, app_label, **options):
+        # options are ImportWorkbook keyword arguments and must be JSON serialisable
+        return self.create(source=str(source), app_label=app_label, options=options)
+
+    def claim_next(self, worker):
+        # The oldest queued job whose app has no running job. Each claim locks the app's jobs first, so two
+        # workers polling at once are serialised per app: the second one waits, then sees the running job
+        # (a conditional UPDATE alone can't see another worker's uncommitted claim on a sibling job)
+        running = self.filter(app_label=OuterRef('app_label'), status=ImportJob.Status.RUNNING)
+        candidates = self.filter(status=ImportJob.Status.QUEUED).exclude(Exists(running)).order_by('created_at', 'pk')
+        for job in candidates:
+            with transaction.atomic(using=self.db):
+                list(self.select_for_update().filter(app_label=job.app_label).order_by('pk').values_list('pk'))
+                claimed = self.filter(pk=job.pk, status=ImportJob.Status.QUEUED).exclude(Exists(running)).update(
+                    status=ImportJob.Status.RUNNING, worker=worker, started_at=timezone.now()
+                )
+            if claimed:
+                job.refresh_from_db()
+                return job
+        return None
+
+
+class ImportJob(models.Model):
+
+    class Status(models.TextChoices):
+        QUEUED = 'queued', 'Queued'
+        RUNNING = 'running', 'Running'
+        SUCCEEDED = 'succeeded', 'Succeeded'
+        FAILED = 'failed', 'Failed'
+
+    app_label = models.CharField(max_length=100, db_index=True)
+    # Workbook, extract or directory path, as accepted by ImportWorkbook
+    source = models.CharField(max_length=500)
+    options = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=Status, default=Status.QUEUED, db_index=True)
+    worker = models.CharField(max_length=255, blank=True)
+    # Progress, updated as sheets start and transactions commit
+    current_sheet = models.CharField(max_length=100, blank=True)
+    sheets_done = models.PositiveIntegerField(default=0)
+    rows_committed = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # ImportWorkbook results: successes, failures and stats
+    results = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    objects = ImportJobManager()
+
+    class Meta:
+        ordering = ['created_at', 'pk']
+
+    def __str__(self):
+        return f"{self.app_label} import #{self.pk} ({self.get_status_display()})"
+
+    @property
+    def seconds(self):
+        if not self.started_at:
+            return None
+        return ((self.finished_at or timezone.now()) - self.started_at).total_seconds()
@@ -0,0 +1,80 @@
+import asyncio
+import threading
+from asgiref.sync import sync_to_async
+from django.db import connections
+from import_export.services.import_workbook import ImportWorkbook
+
+_DONE = object()
+
+
+class ImportCancelled(Exception):
+    pass
+
+
+class AsyncImportWorkbook:
+    """
+    Runs an ImportWorkbook in a worker thread so the event loop stays free while it reads and writes,
+    and streams its progress. Iterating with `async for` starts the import and yields (event, data):
+
+    - ('sheet_started', {'model'}) when a sheet starts
+    - ('rows', {'model', 'rows'}) every batch_size rows written
+    - ('chunk', {'model', 'rows', 'last_row'}) after each committed transaction (each sheet, or chunk_size rows)
+    - ('sheet', sheet_stats) when a sheet finishes
+    - ('import', stats) when the import finishes
+    - ('finished', results) last, with the same results import_workbook() returns
+
+    Each import uses its own thread and database connection, so one event loop can serve many uploads.
+    If the iteration stops early (e.g. the client disconnects), the import is cancelled at its next
+    progress event and the transaction in progress is rolled back.
+    """
+
+    def __init__(self, full_path, app_label, **options):
+        self.full_path = full_path
+        self.app_label = app_label
+        # Any ImportWorkbook option; stats_callbacks still receive every event
+        self.options = options
+        self.results = None
+        self.cancelled = threading.Event()
+
+    def __aiter__(self):
+        return self._iter_events()
+
+    async def run(self):
+        # Runs the import without consuming events and returns its results
+        async for _ in self:
+            pass
+        return self.results
+
+    async def _iter_events(self):
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+
+        def callback(event, data):
+            # Called on the import thread; events are handed to the loop in the order they happen
+            if self.cancelled.is_set() and event in ('sheet_started', 'rows', 'chunk'):
+                raise ImportCancelled("Import cancelled")
+            loop.call_soon_threadsafe(events.put_nowait, (event, data))
+
+        task = asyncio.ensure_future(sync_to_async(self._import, thread_sensitive=False)(callback))
+        # Scheduled after every event the thread has already handed over
+        task.add_done_callback(lambda _: events.put_nowait(_DONE))
+        try:
+            while True:
+                item = await events.get()
+                if item is _DONE:
+                    break
+                yield item
+            self.results = await task
+            yield 'finished', self.results
+        finally:
+            if not task.done():
+                self.cancelled.set()
+
+    def _import(self, callback):
+        options = dict(self.options)
+        options['stats_callbacks'] = [*(options.get('stats_callbacks') or []), callback]
+        try:
+            return ImportWorkbook(self.full_path, self.app_label, **options).import_workbook()
+        finally:
+            # The connection belongs to this executor thread and would otherwise stay open
+            connections.close_all()
@@ -0,0 +1,133 @@
+from functools import reduce
+from operator import or_
+from django.db import connections, models, router
+from import_export.utils.model_helpers import get_comparable_value
+
+
+class BulkUpsertWriter:
+    """
+    Collects cleaned rows for a single model and writes them in batches with bulk_create/bulk_update
+    instead of one update_or_create per row. Rows are matched to existing records by natural key.
+    """
+
+    def __init__(self, model, lookup_fields, batch_size=1000, skip_unchanged=False):
+        self.model = model
+        self.lookup_fields = [model._meta.get_field(name) for name in lookup_fields]
+        self.batch_size = batch_size
+        self.connection = connections[router.db_for_write(model)]
+        self.unique_fields = self._get_unique_fields()
+        self.pending = {}
+        # Delta mode: matched rows whose values already equal the stored ones are not written at all
+        self.skip_unchanged = skip_unchanged
+        self.created_count = 0
+        self.updated_count = 0
+        self.unchanged_count = 0
+
+    def add(self, lookup_data, data):
+        key = self._make_key(lookup_data[field.name] for field in self.lookup_fields)
+        if key in self.pending:
+            # Repeated natural key within a batch: the later row wins and counts as an update,
+            # exactly as a second update_or_create call would
+            self.pending[key] = data
+            self.updated_count += 1
+            return
+
+        self.pending[key] = data
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+
+        existing = self._fetch_existing(self.pending.keys())
+        field_names = set()
+        to_create = []
+        to_update = []
+
+        for key, data in self.pending.items():
+            field_names.update(data)
+            obj = existing.get(key)
+            if obj is None:
+                to_create.append(self.model(**data))
+                continue
+            if self.skip_unchanged and not self._has_changes(obj, data):
+                self.unchanged_count += 1
+                continue
+            for field_name, value in data.items():
+                setattr(obj, field_name, value)
+            to_update.append(obj)
+
+        # Natural key fields already match on matched rows, so only the remaining fields are written
+        update_fields = [name for name in field_names if name not in self.unique_fields]
+
+        if to_create:
+            self.model.objects.bulk_create(
+                to_create, batch_size=self.batch_size, **self._conflict_options(update_fields)
+            )
+        if to_update and update_fields:
+            self.model.objects.bulk_update(to_update, update_fields, batch_size=self.batch_size)
+
+        self.created_count += len(to_create)
+        self.updated_count += len(to_update)
+        self.pending = {}
+
+    def _fetch_existing(self, keys):
+        keys = list(keys)
+        existing = {}
+        if len(self.lookup_fields) == 1:
+            field = self.lookup_fields[0]
+            lookups = [models.Q(**{f"{field.attname}__in": [key[0] for key in keys]})]
+        else:
+            # OR-ed compound lookups are chunked to stay under backend expression/parameter limits
+            chunk_size = max(1, 500 // len(self.lookup_fields))
+            lookups = [
+                reduce(or_, (
+                    models.Q(**{field.attname: value for field, value in zip(self.lookup_fields, key)})
+                    for key in keys[start:start + chunk_size]
+                ))
+                for start in range(0, len(keys), chunk_size)
+            ]
+
+        for lookup in lookups:
+            for obj in self.model.objects.filter(lookup):
+                existing[self._make_key(getattr(obj, field.attname) for field in self.lookup_fields)] = obj
+        return existing
+
+    def _has_changes(self, obj, data):
+        for field_name, value in data.items():
+            field = self.model._meta.get_field(field_name)
+            if get_comparable_value(field, value) != get_comparable_value(field, getattr(obj, field.attname)):
+                return True
+        return False
+
+    def _make_key(self, values):
+        key = []
+        for field, value in zip(self.lookup_fields, values):
+            if isinstance(value, models.Model):
+                value = value.pk
+            elif not field.is_relation:
+                # e.g. Excel datetimes for DateFields, ints for CharFields
+                value = field.to_python(value)
+            key.append(value)
+        return tuple(key)
+
+    def _get_unique_fields(self):
+        lookup_names = {field.name for field in self.lookup_fields}
+        for constraint in self.model._meta.constraints:
+            if isinstance(constraint, models.UniqueConstraint) and not constraint.condition \
+                    and set(constraint.fields) == lookup_names:
+                return list(constraint.fields)
+        if len(self.lookup_fields) == 1 and self.lookup_fields[0].unique:
+            return [self.lookup_fields[0].name]
+        return []
+
+    def _conflict_options(self, update_fields):
+        features = self.connection.features
+        if not self.unique_fields:
+            return {}
+        if update_fields and features.supports_update_conflicts_with_target:
+            return {'update_conflicts': True, 'unique_fields': self.unique_fields, 'update_fields': update_fields}
+        if not update_fields and features.supports_ignore_conflicts:
+            return {'ignore_conflicts': True}
+        return {}
@@ -0,0 +1,107 @@
+import os
+import socket
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from time import sleep
+from django.db import connections
+from django.utils import timezone
+from import_export.models import ImportJob
+from import_export.services.import_workbook import ImportWorkbook, _init_import_worker
+
+
+class ImportJobRunner:
+    """
+    Runs queued ImportJobs in up to `concurrency` worker processes, polling the database for new jobs.
+    Jobs for the same app never run at the same time, so they don't contend for the same tables and locks;
+    jobs for different apps run side by side. No broker is needed, the job table is the queue.
+    """
+
+    def __init__(self, concurrency=1, poll_interval=2, name=None):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+
+    def run(self, burst=False, max_jobs=None):
+        # With burst=True, returns once the queue is empty instead of waiting for new jobs
+        started = 0
+        with ProcessPoolExecutor(max_workers=self.concurrency, initializer=_init_import_worker) as executor:
+            running = {}
+            while True:
+                while len(running) < self.concurrency and (max_jobs is None or started < max_jobs):
+                    job = ImportJob.objects.claim_next(self.name)
+                    if job is None:
+                        break
+                    # Job processes may be forked on submit; never hand them this process's open connection
+                    connections.close_all()
+                    running[executor.submit(run_import_job, job.pk)] = job
+                    started += 1
+
+                if not running and (burst or (max_jobs is not None and started >= max_jobs)):
+                    return started
+                if not running:
+                    sleep(self.poll_interval)
+                    continue
+
+                done, _ = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = running.pop(future)
+                    try:
+                        future.result()
+                    except Exception as e:
+                        # The job process died before it could record the outcome itself
+                        _finish_job(job.pk, ImportJob.Status.FAILED, error=f"{e}\n{traceback.format_exc()}")
+
+    @staticmethod
+    def reset_running(worker=None):
+        # Fails jobs left running by a worker that was stopped or crashed, which would otherwise block their app
+        jobs = ImportJob.objects.filter(status=ImportJob.Status.RUNNING)
+        if worker:
+            jobs = jobs.filter(worker=worker)
+        return jobs.update(
+            status=ImportJob.Status.FAILED, finished_at=timezone.now(), error="Interrupted: the worker stopped"
+        )
+
+
+def run_import_job(job_id):
+    # Runs in a job process; the outcome is stored on the job rather than returned
+    job = ImportJob.objects.get(pk=job_id)
+    try:
+        importer = ImportWorkbook(
+            job.source, job.app_label, stats_callbacks=[_JobProgress(job_id)], **job.options
+        )
+        results = importer.import_workbook()
+        status = ImportJob.Status.FAILED if results["failures"] else ImportJob.Status.SUCCEEDED
+        _finish_job(job_id, status, results=results)
+    except Exception as e:
+        _finish_job(job_id, ImportJob.Status.FAILED, error=f"{e}\n{traceback.format_exc()}")
+    finally:
+        connections.close_all()
+
+
+class _JobProgress:
+    # Only events outside the import's transactions are stored, so progress is visible to other
+    # connections and never rolled back with a failed sheet
+    def __init__(self, job_id):
+        self.jobs = ImportJob.objects.filter(pk=job_id)
+        self.sheets_done = 0
+        self.rows_committed = 0
+        self.sheet_rows = 0
+
+    def __call__(self, event, data):
+        if event == 'sheet_started':
+            self.sheet_rows = 0
+            self.jobs.update(current_sheet=data['model'])
+        elif event == 'chunk':
+            self.sheet_rows = data['rows']
+            self.jobs.update(rows_committed=self.rows_committed + self.sheet_rows)
+        elif event == 'sheet':
+            # A sheet that fails after some committed chunks keeps them; a dry run only reports its rows here
+            self.sheets_done += 1
+            self.rows_committed += self.sheet_rows or data['rows']
+            self.jobs.update(sheets_done=self.sheets_done, rows_committed=self.rows_committed)
+
+
+def _finish_job(job_id, status, results=None, error=''):
+    ImportJob.objects.filter(pk=job_id).update(
+        status=status, results=results, error=error, current_sheet='', finished_at=timezone.now()
+    )
@@ -0,0 +1,259 @@
+from contextlib import nullcontext
+from itertools import islice, repeat
+from treebeard.mp_tree import MP_Node
+from import_export.utils.column_coercion import InvalidRow, get_column_coercer
+from import_export.utils.model_helpers import (
+    _map_choice_display_to_value, get_model_fields, get_natural_key_fields, resolve_foreign_key
+)
+
+
+class ImportPlan:
+    """
+    Compiled once per model sheet: maps each column index to a converter so rows are decoded
+    straight from the sheet's value tuples without per-row header parsing or introspection.
+
+    Rows are prepared a batch at a time before decoding: date, decimal and boolean columns are coerced,
+    and choice labels and foreign keys are resolved once per distinct value per sheet, then mapped back
+    over the column. Compound foreign keys are resolved into an extra column appended to each row.
+    """
+
+    def __init__(self, model, headers, choice_maps, key_cache, resolve_mp_parent=True):
+        self.model = model
+        self.headers = tuple(headers)
+        self.choice_maps = choice_maps
+        self.key_cache = key_cache
+        self.model_fields = get_model_fields(model)
+        self.lookup_fields = get_natural_key_fields(model)
+        self.is_mp_node = issubclass(model, MP_Node)
+        # The bulk tree loader places nodes itself and needs the parent's raw natural key
+        self.resolve_mp_parent = resolve_mp_parent
+        # (field_name, column index, converter or None for passthrough)
+        self.columns = []
+        # (column index, coerce) for passthrough date, decimal and boolean columns, converted per batch
+        self.coerced_columns = []
+        # (label, source column indexes, target column index, resolve) for choice and FK columns; compound
+        # keys read several columns, and any missing key column reads as None
+        self.key_columns = []
+        # label -> {raw value or key tuple: resolved value or _Unresolved}, reset for every sheet
+        self.resolved_keys = {}
+        # Length of a prepared row: the sheet's columns plus one per compound foreign key
+        self.row_width = len(self.headers)
+        # Models whose natural keys are resolved while preparing rows
+        self.related_models = set()
+        # Context manager factory wrapped around each column's resolution, see trace_converters()
+        self.trace = None
+        # MP_Node parents are looked up with get_by_natural_key() rather than through the key cache
+        self.needs_connection = False
+
+        self._register_choice_maps()
+        self._compile_columns()
+
+    def decode(self, row_values):
+        # Returns the cleaned data dict for a row, or None for a blank row
+        if row_values.__class__ is InvalidRow:
+            raise ValueError(str(row_values))
+        if not any(row_values):
+            return None
+
+        data = {}
+        for field_name, index, converter in self.columns:
+            value = row_values[index]
+            data[field_name] = converter(value) if converter else value
+        return data
+
+    def iter_prepared(self, numbered_rows, batch_size=1000):
+        # Rows with cells that can't be coerced or resolved are yielded as InvalidRow in their place
+        self.resolved_keys = {label: {} for label, _, _, _ in self.key_columns}
+        if not (self.coerced_columns or self.key_columns):
+            yield from numbered_rows
+            return
+        while True:
+            batch = list(islice(numbered_rows, batch_size))
+            if not batch:
+                return
+            yield from self.prepare_batch(batch)
+
+    def prepare_batch(self, batch):
+        # Blank rows are passed through untouched and skipped by decode()
+        prepared = [(row_number, row_values) for row_number, row_values in batch if any(row_values)]
+        if not prepared:
+            return batch
+        row_count = len(prepared)
+        columns = list(zip(*(row_values for _, row_values in prepared)))
+        width = len(columns)
+        errors = {}
+
+        for index, coerce in self.coerced_columns:
+            if index >= width:
+                continue
+            columns[index], column_errors = coerce(columns[index])
+            for position, error in column_errors.items():
+                errors.setdefault(position, []).append(error)
+
+        # Compound key targets sit past the sheet's own columns
+        columns.extend([(None,) * row_count] * (self.row_width - width))
+        for label, indexes, target, resolve in self.key_columns:
+            with self.trace(label) if self.trace else nullcontext():
+                keys = [columns[index] if index is not None else repeat(None, row_count) for index in indexes]
+                keys = keys[0] if len(keys) == 1 else list(zip(*keys))
+                columns[target] = self._resolve_column(label, keys, resolve, errors)
+
+        rows = zip((row_number for row_number, _ in prepared), zip(*columns))
+        if errors:
+            rows = [
+                (row_number, InvalidRow(row_number, errors[position]) if position in errors else row_values)
+                for position, (row_number, row_values) in enumerate(rows)
+            ]
+        if len(prepared) == len(batch):
+            return rows
+        # Put the blank rows back in sheet order
+        prepared_rows = dict(rows)
+        return [(row_number, prepared_rows.get(row_number, row_values)) for row_number, row_values in batch]
+
+    def trace_converters(self, trace):
+        # trace(label) returns a context manager entered around every converter call and column resolution,
+        # so work done while decoding (e.g. queries) can be attributed to the FK, choice or MP parent column
+        self.trace = trace
+        self.columns = [
+            (field_name, index, _traced(converter, trace, self._get_label(field_name)) if converter else None)
+            for field_name, index, converter in self.columns
+        ]
+
+    def preload_keys(self):
+        # Loads every related model's keys up front, so preparing rows runs from memory and, unless
+        # needs_connection is set, so does decode(); both are then safe on a thread without a connection
+        for related_model in self.related_models:
+            if related_model not in self.key_cache.key_maps:
+                self.key_cache.load(related_model)
+
+    def get_lookup_data(self, data):
+        # Natural key lookup for update_or_create, or None if any part is missing
+        lookup_data = {field_name: data.get(field_name) for field_name in self.lookup_fields}
+        if any(value is None for value in lookup_data.values()):
+            return None
+        return lookup_data
+
+    def _register_choice_maps(self):
+        # Choice maps come from model metadata, so they don't depend on other sheets being imported first
+        for field in self.model_fields.values():
+            if field.choices:
+                self._add_choice_map(field)
+            if field.is_relation and (field.many_to_one or field.one_to_one):
+                for _, leaf_field in self.key_cache.get_key_paths(field.remote_field.model):
+                    if leaf_field.choices:
+                        self._add_choice_map(leaf_field)
+
+    def _add_choice_map(self, field):
+        model_choices = self.choice_maps[field.model.__name__]
+        if field.name not in model_choices:
+            model_choices[field.name] = dict((label, value) for value, label in field.choices)
+
+    def _compile_columns(self):
+        compound_fk_columns = {}
+
+        for index, header in enumerate(self.headers):
+            if header is None:
+                continue
+            if '\n' in header:
+                fk_field, subfield = header.split('\n', 1)
+                compound_fk_columns.setdefault(fk_field, {})[subfield] = index
+                continue
+
+            if header not in self.model_fields:
+                if self.is_mp_node and header == 'parent':
+                    self.needs_connection = self.resolve_mp_parent
+                    self.columns.append((header, index, self._resolve_parent if self.resolve_mp_parent else None))
+                    continue
+                raise ValueError(f"Column '{header}' does not match a field on {self.model.__name__}")
+
+            field = self.model_fields[header]
+            # Resolved in place during prepare_batch(), then passed through by decode()
+            self.columns.append((header, index, None))
+            resolve = self._get_resolver(field)
+            if resolve:
+                self.key_columns.append((self._get_label(header), (index,), index, resolve))
+            else:
+                coerce = get_column_coercer(field)
+                if coerce:
+                    self.coerced_columns.append((index, coerce))
+
+        for fk_field, subfield_indexes in compound_fk_columns.items():
+            if fk_field not in self.model_fields:
+                continue
+            field = self.model_fields[fk_field]
+            key_fields = get_natural_key_fields(field.remote_field.model)
+            self.related_models.add(field.remote_field.model)
+            target = self.row_width
+            self.row_width += 1
+            self.columns.append((fk_field, target, None))
+            self.key_columns.append(
+                (f"fk {fk_field}", tuple(subfield_indexes.get(k) for k in key_fields), target,
+                 self._get_compound_resolver(field))
+            )
+
+    def _resolve_column(self, label, keys, resolve, errors):
+        # Each distinct raw value is resolved once per sheet and the results mapped back over the column
+        resolved = self.resolved_keys[label]
+        for key in set(keys).difference(resolved):
+            try:
+                resolved[key] = resolve(key)
+            except Exception as e:
+                resolved[key] = _Unresolved(str(e))
+        values = [resolved[key] for key in keys]
+        if any(value.__class__ is _Unresolved for value in resolved.values()):
+            for position, value in enumerate(values):
+                if value.__class__ is _Unresolved:
+                    errors.setdefault(position, []).append(value.error)
+        return values
+
+    def _get_resolver(self, field):
+        if field.choices:
+            choice_map = self.choice_maps[field.model.__name__][field.name]
+            return lambda value: _map_choice_display_to_value(value, choice_map)
+
+        if field.is_relation and (field.many_to_one or field.one_to_one):
+            self.related_models.add(field.remote_field.model)
+
+            def resolve_key(value):
+                if value is None and field.null:
+                    return None
+                return resolve_foreign_key(field, value, self.choice_maps, self.key_cache)
+            return resolve_key
+
+        return None
+
+    def _get_compound_resolver(self, field):
+        def resolve_key(key_values):
+            if all(v is None for v in key_values):
+                if not field.null:
+                    raise ValueError(f"Field '{field.name}' does not allow null values and no data was provided.")
+                return None
+            if any(v is None for v in key_values):
+                raise ValueError(f"Partial values for compound FK '{field.name}': {list(key_values)}")
+            return resolve_foreign_key(field, key_values, self.choice_maps, self.key_cache)
+        return resolve_key
+
+    def _get_label(self, field_name):
+        if field_name not in self.model_fields:
+            return "mp parent"
+        return f"{'choice' if self.model_fields[field_name].choices else 'fk'} {field_name}"
+
+    def _resolve_parent(self, value):
+        if value is None:
+            return None
+        return self.model.objects.get_by_natural_key(value)
+
+
+class _Unresolved:
+    # Cached in place of a value that failed to resolve, so the failure is not retried for every row
+    __slots__ = ('error',)
+
+    def __init__(self, error):
+        self.error = error
+
+
+def _traced(converter, trace, label):
+    def convert(value):
+        with trace(label):
+            return converter(value)
+    return convert
@@ -1,22 +1,43 @@
+import warnings
+
 # Third‑party
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, Alignment
-from openpyxl.utils import get_column_letter
+from openpyxl.utils import get_column_letter, range_boundaries
 from openpyxl.workbook.defined_name import DefinedName
 from openpyxl.worksheet.datavalidation import DataValidation
-from openpyxl.worksheet.table import Table, TableStyleInfo
+from openpyxl.worksheet.filters import AutoFilter
+from openpyxl.worksheet.table import Table, TableColumn, TableStyleInfo
 from treebeard.mp_tree import MP_Node
 from django.apps import apps
 from django.db import models
 from import_export.utils.mp_node_helpers import MP_NODE_AUTO_FIELDS
+from import_export.utils.natural_key_cache import NaturalKeyCache
 
 
 class ImportTemplateBuilder:
-    def __init__(self, app_label):
+    """
+    Builds the import template for an app. With write_only=True the workbook is an openpyxl write-only
+    workbook: each sheet's cells are streamed to a temporary file as the sheet is built, and only the
+    tables, named ranges and data validations stay in memory until the workbook is saved. The file is
+    equivalent either way, but a write-only workbook can't be read back and can only be saved once.
+
+    With with_data=True each table is filled with the model's existing rows, streamed from the database
+    chunk_size rows at a time, so the template can be edited and imported back.
+    """
+
+    def __init__(self, app_label, write_only=False, with_data=False, chunk_size=2000):
         self.app_label = app_label
         self.app_config = apps.get_app_config(app_label)
-        self.workbook = openpyxl.Workbook()
-        self.workbook.remove(self.workbook.active)
+        self.write_only = write_only
+        self.with_data = with_data
+        self.chunk_size = chunk_size
+        # Only used for its natural key paths, so exported keys match what the importer resolves
+        self.key_cache = NaturalKeyCache()
+        self.workbook = openpyxl.Workbook(write_only=write_only)
+        if not write_only:
+            self.workbook.remove(self.workbook.active)
         # Add app label to workbook as a named value
         self.app_named_value = DefinedName(name="_app", attr_text=f'"{self.app_label}"')
         self.workbook.defined_names.add(self.app_named_value)
@@ -121,29 +142,82 @@ class ImportTemplateBuilder:
     def create_model_worksheet(self, model):
         model_name = model.__name__
         ws = self.workbook.create_sheet(title=model_name)
-        ws.column_dimensions['A'].width = 2
-        ws['A1'].value = model_name
-        ws['A1'].font = Font(bold=True)
 
         exportable_fields = self.get_exportable_fields(model)
         self.model_fields_map[model_name] = exportable_fields
+        headers = [field_info['header'] for field_info in exportable_fields]
 
+        # Widths come first, as a write-only sheet writes them out with its first row
         start_col, start_row = 2, 3
-        for col_index, field_info in enumerate(exportable_fields):
+        ws.column_dimensions['A'].width = 2
+        for col_index, header in enumerate(headers):
             col_letter = get_column_letter(start_col + col_index)
-            cell = ws[f"{col_letter}{start_row}"]
-            cell.value = field_info['header']
-            cell.alignment = Alignment(wrap_text=True)
-            ws.column_dimensions[col_letter].width = max(len(field_info['header'].split('\n')[0]) + 2, 12)
+            ws.column_dimensions[col_letter].width = max(len(header.split('\n')[0]) + 2, 12)
+
+        if self.write_only:
+            ws.append([self._get_styled_cell(ws, model_name, font=Font(bold=True))])
+            ws.append([])
+            ws.append([None] + [
+                self._get_styled_cell(ws, header, alignment=Alignment(wrap_text=True)) for header in headers
+            ])
+        else:
+            ws['A1'].value = model_name
+            ws['A1'].font = Font(bold=True)
+            for col_index, header in enumerate(headers):
+                cell = ws.cell(row=start_row, column=start_col + col_index, value=header)
+                cell.alignment = Alignment(wrap_text=True)
+
+        row_count = 0
+        if self.with_data:
+            for values in self.iter_model_rows(model, exportable_fields):
+                ws.append([None] + values)
+                row_count += 1
 
         end_col_letter = get_column_letter(start_col + len(exportable_fields) - 1)
-        table_range = f"B3:{end_col_letter}4"
-        table = Table(displayName=model_name, ref=table_range)
-        style = TableStyleInfo(name="TableStyleLight1", showFirstColumn=False, showLastColumn=False,
-                               showRowStripes=True, showColumnStripes=False)
-        table.tableStyleInfo = style
-        ws.add_table(table)
-        self.table_refs[model_name] = table
+        # An empty table still gets one blank data row to type into
+        table_range = f"B3:{end_col_letter}{start_row + max(row_count, 1)}"
+        self.table_refs[model_name] = self._add_table(ws, model_name, table_range, headers)
+
+    def iter_model_rows(self, model, exportable_fields):
+        """
+        Yields the cell values of each of the model's rows in column order: foreign keys as their natural
+        keys, choices as labels and an MP_Node parent as the parent's natural key. Every value comes from one
+        query joining the related models' key fields; trees are ordered by path, so parents come first.
+        """
+        paths = []
+        converters = []
+        for field_info in exportable_fields:
+            if field_info.get('mp_node_parent'):
+                continue
+            path, leaf_field = self._get_export_path(model, field_info)
+            paths.append(path)
+            if leaf_field.choices:
+                labels = dict(leaf_field.choices)
+                converters.append(lambda value, labels=labels: labels.get(value, value))
+            else:
+                converters.append(None)
+
+        is_mp_node = issubclass(model, MP_Node)
+        queryset = model._default_manager.all()
+        if is_mp_node:
+            # The parent column is written from each node's own key, raw as get_by_natural_key() takes it
+            key_path, _ = self._get_key_path(model)
+            paths += [key_path, 'depth']
+            queryset = queryset.order_by('path')
+        else:
+            queryset = queryset.order_by('pk')
+
+        # Natural keys of the current node's ancestors, one per depth
+        ancestors = []
+        for values in queryset.values_list(*paths).iterator(chunk_size=self.chunk_size):
+            row = [convert(value) if convert else value for convert, value in zip(converters, values)]
+            if is_mp_node:
+                key, depth = values[-2:]
+                # Path order is depth first, so the parent is the last node seen one level up
+                del ancestors[depth - 1:]
+                row.append(ancestors[-1] if ancestors else None)
+                ancestors.append(key)
+            yield row
 
     def resolve_foreign_keys(self):
         for model in self.app_config.get_models():
@@ -212,7 +286,7 @@ class ImportTemplateBuilder:
                     col_letter = get_column_letter(2 + col_index)
                     data_range = f"{col_letter}4:{col_letter}1048576"
                     dv.add(data_range)
-                    ws.add_data_validation(dv)
+                    ws.data_validations.append(dv)
 
     def add_boolean_field_validations(self):
         for model_name, exportable_fields in self.model_fields_map.items():
@@ -232,12 +306,12 @@ class ImportTemplateBuilder:
                     col_letter = get_column_letter(2 + col_index)
                     data_range = f"{col_letter}4:{col_letter}1048576"
                     dv.add(data_range)
-                    ws.add_data_validation(dv)
+                    ws.data_validations.append(dv)
 
     def add_choices_sheet(self):
         ws_choices = self.workbook.create_sheet(title="Choices")
-        ws_choices['A1'].value = "Choices"
-        ws_choices['A1'].font = Font(bold=True)
+        # Column index -> its cells from the header row (row 3) down
+        columns = {}
         current_col = 2
 
         for model_name, field_info in self.choice_fields:
@@ -245,37 +319,42 @@ class ImportTemplateBuilder:
             key_col = current_col
             label_col = current_col + 1
 
-            ws_choices[f"{get_column_letter(key_col)}3"] = f"{field_info['field_name']}_key"
-            ws_choices[f"{get_column_letter(label_col)}3"] = f"{field_info['field_name']}_label"
-
-            row = 4
+            columns[key_col] = [f"{field_info['field_name']}_key"]
+            columns[label_col] = [f"{field_info['field_name']}_label"]
             for key, label in field_info['choices_type']:
-                ws_choices[f"{get_column_letter(key_col)}{row}"] = key
-                ws_choices[f"{get_column_letter(label_col)}{row}"] = label
-                row += 1
-            end_row = row - 1
+                columns[key_col].append(key)
+                columns[label_col].append(label)
+            end_row = 3 + len(field_info['choices_type'])
 
             table_range = f"{get_column_letter(key_col)}3:{get_column_letter(label_col)}{end_row}"
-            table = Table(displayName=choices_name, ref=table_range)
-            style = TableStyleInfo(name="TableStyleLight1", showFirstColumn=False, showLastColumn=False,
-                                   showRowStripes=True, showColumnStripes=False)
-            table.tableStyleInfo = style
-            ws_choices.add_table(table)
+            self._add_table(ws_choices, choices_name, table_range, [columns[key_col][0], columns[label_col][0]])
             dn = DefinedName(name=f"lst{choices_name}",
                              attr_text=f"Choices!${get_column_letter(label_col)}$4:${get_column_letter(label_col)}${end_row}")
             self.workbook.defined_names.add(dn)
             current_col += 3
 
         for col_idx in range(2, current_col):
-            max_length = 0
-            column_letter = get_column_letter(col_idx)
-            for cell in ws_choices[column_letter]:
-                if cell.value:
-                    max_length = max(max_length, len(str(cell.value)))
-            ws_choices.column_dimensions[column_letter].width = max_length + 2
+            max_length = max((len(str(value)) for value in columns.get(col_idx, []) if value), default=0)
+            ws_choices.column_dimensions[get_column_letter(col_idx)].width = max_length + 2
 
         ws_choices.column_dimensions['A'].width = 2  # Ensure column A width
 
+        if self.write_only:
+            ws_choices.append([self._get_styled_cell(ws_choices, "Choices", font=Font(bold=True))])
+            ws_choices.append([])
+            for row_index in range(max((len(values) for values in columns.values()), default=0)):
+                row = [None] * current_col
+                for col_idx, values in columns.items():
+                    if row_index < len(values):
+                        row[col_idx - 1] = values[row_index]
+                ws_choices.append(row)
+        else:
+            ws_choices['A1'].value = "Choices"
+            ws_choices['A1'].font = Font(bold=True)
+            for col_idx, values in columns.items():
+                for row_index, value in enumerate(values):
+                    ws_choices.cell(row=3 + row_index, column=col_idx, value=value)
+
     def _add_choice_field_validations(self):
         for model_name, exportable_fields in self.model_fields_map.items():
             ws = self.workbook[model_name]
@@ -294,7 +373,7 @@ class ImportTemplateBuilder:
                     col_letter = get_column_letter(2 + col_index)
                     data_range = f"{col_letter}4:{col_letter}1048576"
                     dv.add(data_range)
-                    ws.add_data_validation(dv)
+                    ws.data_validations.append(dv)
 
     def _add_parent_field_validations_for_mp_node_models(self):
         for model_name, exportable_fields in self.model_fields_map.items():
@@ -324,11 +403,67 @@ class ImportTemplateBuilder:
                                 col_letter = get_column_letter(2 + col_index)
                                 data_range = f"{col_letter}4:{col_letter}1048576"
                                 dv.add(data_range)
-                                ws.add_data_validation(dv)
+                                ws.data_validations.append(dv)
 
             except LookupError:
                 continue
 
+    def _get_export_path(self, model, field_info):
+        # (lookup path, leaf field) of the value written to a column
+        if 'related_model' not in field_info:
+            return field_info['field_name'], model._meta.get_field(field_info['field_name'])
+
+        fk_name = field_info['header'].split('\n')[0]
+        resolved_field = field_info.get('resolved_field')
+        if not resolved_field:
+            return self._get_key_path(field_info['related_model'], prefix=fk_name)
+
+        # One column of a compound key, which may itself be a foreign key (e.g. fiscal_year_period's fiscal_year)
+        field = field_info['related_model']._meta.get_field(resolved_field)
+        prefix = f"{fk_name}__{resolved_field}"
+        if field.is_relation:
+            return self._get_key_path(field.remote_field.model, prefix=prefix)
+        return prefix, field
+
+    def _get_key_path(self, model, prefix=None):
+        key_paths = self.key_cache.get_key_paths(model)
+        if len(key_paths) != 1:
+            raise ValueError(
+                f"{model.__name__} has a compound natural key, which can't be exported to a single column"
+            )
+        path, leaf_field = key_paths[0]
+        if prefix:
+            return f"{prefix}__{path}", leaf_field
+        return path, leaf_field
+
+    def _add_table(self, ws, display_name, table_range, headers):
+        table = Table(displayName=display_name, ref=table_range)
+        style = TableStyleInfo(name="TableStyleLight1", showFirstColumn=False, showLastColumn=False,
+                               showRowStripes=True, showColumnStripes=False)
+        table.tableStyleInfo = style
+        if self.write_only:
+            # Write-only sheets can't read their header cells back, so the columns and filter are declared
+            # the way openpyxl derives them from a normal sheet on save
+            start_col = range_boundaries(table_range)[0]
+            table.tableColumns = [
+                TableColumn(id=start_col + i, name=header) for i, header in enumerate(headers)
+            ]
+            table.autoFilter = AutoFilter(ref=table_range)
+            with warnings.catch_warnings():
+                # openpyxl reminds write-only sheets to declare their table columns, which they just did
+                warnings.simplefilter('ignore', UserWarning)
+                ws.add_table(table)
+        else:
+            ws.add_table(table)
+        return table
+
+    @staticmethod
+    def _get_styled_cell(ws, value, **styles):
+        cell = WriteOnlyCell(ws, value=value)
+        for name, style in styles.items():
+            setattr(cell, name, style)
+        return cell
+
     def _collect_exportable_fields(self):
         """Populates model_fields_map for all relevant models."""
         for model in self.app_config.get_models():
@@ -1,155 +1,338 @@
 import traceback
+import warnings
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
+from pathlib import Path
+import django
 from django.apps import apps
-from django.db import models, transaction
-from openpyxl import load_workbook
-from openpyxl.utils import range_boundaries
-from openpyxl.worksheet.table import Table
-from treebeard.mp_tree import MP_Node
-from import_export.utils.model_helpers import get_cleaned_field_value, resolve_foreign_key
-from import_export.utils.mp_node_helpers import create_mp_node, MP_NODE_AUTO_FIELDS
+from django.db import connections, router, transaction
+from import_export.services.bulk_upsert import BulkUpsertWriter
+from import_export.services.import_plan import ImportPlan
+from import_export.services.model_scheduler import ModelScheduler
+from import_export.services.readers import get_reader, is_buffer
+from import_export.services.row_pipeline import RowPipeline
+from import_export.utils.column_coercion import InvalidRow
+from import_export.utils.natural_key_cache import NaturalKeyCache
+from import_export.utils.mp_node_helpers import create_mp_node, MPNodeBulkLoader
+from import_export.utils.import_state import ImportStateStore
+from import_export.utils.import_stats import ImportStats
+from import_export.utils.sqlite_bulk_load import SQLiteBulkLoadSession
+
+# Seconds a parallel worker waits for the SQLite write lock held by another sheet
+SQLITE_WORKER_LOCK_TIMEOUT = 600
+# Row numbers listed for an error shared by many rows of a --dry-run
+INVALID_ROW_NUMBERS_SHOWN = 5
+# The source of a parallel worker process, opened once by _init_import_worker
+_worker_reader = None
 
 
 class ImportWorkbook:
-    def __init__(self, full_path, app_label):
+    def __init__(self, full_path, app_label, read_only=False, bulk=False, batch_size=1000, workers=1,
+                 chunk_size=None, resume=False, state_path=None, dry_run=False, delta=False, pipeline=False,
+                 queue_size=4, trace_memory=False, stats_callbacks=None, query_budget=None,
+                 query_budget_allowance=10, on_query_budget='warn', source_name=None, sqlite_bulk_load=False,
+                 defer_indexes=False, skip_unchanged=False, models=None):
+        # An .xlsx workbook, a single .csv/.jsonl/.parquet extract, or a directory of per-model extracts.
+        # It can also be held in memory: bytes, or a binary file-like object such as an UploadedFile,
+        # BytesIO or mmap, read in place; source_name (default: the object's name) identifies a CSV,
+        # JSONL or Parquet buffer and its model
         self.full_path = full_path
+        self.source_name = source_name
         self.app_label = app_label
-        self.related_model = None
-        self.code_obj = None
-        self.key_fields= None
+        # Only these models' sheets are imported; related keys and choice labels come from the database and
+        # model metadata, so the rest of the source is never read. Read-only workbooks only parse the
+        # worksheets that are opened, so a partial import always streams the workbook
+        self.models = list(models) if models else None
+        # Streams rows from read-only worksheets so memory stays flat regardless of sheet size
+        self.read_only = read_only or bool(self.models)
+        # Writes rows in batches with bulk_create/bulk_update instead of update_or_create, and loads
+        # MP_Node sheets as whole trees instead of one add_child() per row
+        self.bulk = bulk
+        self.batch_size = batch_size
+        # Sheets with no dependency between them are imported concurrently in this many worker processes
+        self.workers = workers
+        # Commits every chunk_size rows and records a checkpoint that a later run can resume from
+        self.chunk_size = chunk_size
+        self.resume = resume
+        self.state_path = state_path or get_default_state_path(app_label)
+        self.state_store = None
+        # Only set for chunked or resumable imports, which keep a checkpoint in the state store
+        self.workbook_hash = None
+        self.checkpoint = None
+        self.completed_sheets = []
+        # Validates every sheet against the database and the workbook itself without writing anything
+        self.dry_run = dry_run
+        # Compares rows with the stored values in bulk and only writes rows that are new or changed
+        self.delta = delta
+        # Reads and decodes rows in a producer thread while this thread writes; queue_size batches of
+        # batch_size rows are the most held in memory at once
+        self.pipeline = pipeline
+        self.queue_size = queue_size
+        # Per-sheet and per-phase timings, query counts and throughput, returned as results["stats"];
+        # stats_callbacks receive them as each sheet and the whole import finish
+        self.stats = ImportStats(trace_memory=trace_memory, callbacks=stats_callbacks)
+        # Queries a sheet may issue per row, plus a fixed allowance for key loads, savepoints and bulk
+        # flushes; exceeding it warns or, with on_query_budget='raise', fails the import
+        self.query_budget = query_budget
+        self.query_budget_allowance = query_budget_allowance
+        if on_query_budget not in ('warn', 'raise'):
+            raise ValueError(f"on_query_budget must be 'warn' or 'raise', not '{on_query_budget}'.")
+        self.on_query_budget = on_query_budget
+        # On SQLite, switches to WAL, relaxed synchronous and a larger page cache for the import, and with
+        # defer_indexes drops the imported tables' non-unique indexes and rebuilds them at the end
+        self.sqlite_bulk_load = sqlite_bulk_load or defer_indexes
+        self.defer_indexes = defer_indexes
+        # Skips sheets whose fingerprint (a hash of the table's headers and cells) matches the one stored
+        # after their last successful import
+        self.skip_unchanged = skip_unchanged
+        # Set by parallel workers on SQLite, whose sheet transactions take the single write lock as they start:
+        # each chunk is read, prepared and decoded before its transaction, so other workers can read meanwhile
+        self.read_before_write = False
         self.choice_maps = defaultdict(dict)
-        self.model_fields = {}
+        self.key_cache = NaturalKeyCache()
+        self.import_plans = {}
 
     def import_workbook(self):
-        wb = load_workbook(self.full_path, data_only=True)
-        self._validate_app_label(wb)
-        app_config = apps.get_app_config(self.app_label)
-        app_models = app_config.get_models()
-
         results = {
             "successes": [],
             "failures": []
         }
+        with self.stats:
+            self._run_import(results)
+        results["stats"] = self.stats.as_dict()
+        return results
 
+    def _run_import(self, results):
+        reader = None
+        bulk_load = None
+        # The sheet being imported sequentially; parallel workers report their own sheets' failures
+        current_model = None
+        # Everything runs inside the try, so invalid options or sources are reported like any other failure
+        # and the reader is always closed
         try:
-            for model in app_models:
-                model_name = model.__name__
-                if model_name not in wb.sheetnames:
-                    continue
+            if self.workers > 1 and not self.dry_run and is_buffer(self.full_path):
+                raise ValueError("Parallel workers open the source themselves, so it must be a path, not a buffer.")
+            with self.stats.phase('load'):
+                reader = self._open_reader()
+            reader.validate_app_label(self.app_label)
+            app_config = apps.get_app_config(self.app_label)
+            # Parents before children regardless of declaration order; circular FKs fail here, before any writes
+            levels = ModelScheduler(app_config.get_models()).get_levels()
 
-                sheet = wb[model_name]
-                table = next(
-                    (tbl for tbl in sheet._tables.values() if isinstance(tbl, Table) and tbl.displayName == model_name),
-                    None
+            if (self.chunk_size or self.resume) and not self.dry_run:
+                if self.workers > 1:
+                    raise ValueError(
+                        "Chunked commits and resumable checkpoints can't be combined with parallel workers."
+                    )
+                self.state_store = ImportStateStore(self.state_path)
+                self.workbook_hash = reader.get_source_hash()
+                if self.resume:
+                    self.checkpoint = self.state_store.get_checkpoint(self.workbook_hash)
+                    if self.checkpoint:
+                        self.completed_sheets = list(self.checkpoint['completed_sheets'])
+            if self.skip_unchanged and not self.dry_run and not self.state_store:
+                self.state_store = ImportStateStore(self.state_path)
+
+            if self.models:
+                selected = self._get_selected_models(app_config, reader)
+                levels = [[model for model in level if model in selected] for level in levels]
+
+            if self.sqlite_bulk_load and not self.dry_run:
+                bulk_load = SQLiteBulkLoadSession(
+                    [model for level in levels for model in level if model.__name__ in reader.sheet_names],
+                    defer_indexes=self.defer_indexes,
+                    state_store=self.state_store or ImportStateStore(self.state_path)
                 )
-                if not table:
-                    continue
+                with self.stats.phase('load'):
+                    bulk_load.start()
 
-                min_col, min_row, max_col, max_row = range_boundaries(table.ref)
-                headers = [sheet.cell(row=min_row, column=col).value for col in range(min_col, max_col + 1)]
-
-                model_fields = self._get_model_fields(model)
-                for field in model_fields.values():
-                    if field.choices:
-                        self.choice_maps[model.__name__][field.name] = dict((label, value) for value, label in field.choices)
-
-                    if field.is_relation and (field.many_to_one or field.one_to_one):
-                        self.related_model = field.remote_field.model
-                        if hasattr(self.related_model.objects, 'get_natural_key'):
-                            try:
-                                self.code_obj = self.related_model.objects.get_by_natural_key.__code__
-                                self.key_fields = list(self.code_obj.co_varnames[:self.code_obj.argcount])[1:]
-                            except Exception as e:
-                                error_details = traceback.format_exc()
-                                results["failures"].append(f"Could not introspect natural_key() for {self.related_model.__name__} – {e}\n{error_details}")
-
-                            for key_field in self.key_fields:
-                                self.rel_field = self.related_model._meta.get(key_field)
-                                if self.rel_field.choices:
-                                    self.choice_maps[self.related_model.__name__][key_field] = dict((label, value) for value, label in self.rel_field.choices)
-
-                created_count = 0
-                updated_count = 0
-
-                with transaction.atomic():
-                    data_start_row = min_row + 1
-                    data_end_row = max_row - (1 if table.totalsRowCount else 0)
-
-                    for row_idx in range(data_start_row, data_end_row + 1):
-                        row_values = [sheet.cell(row=row_idx, column=col).value for col in range(min_col, max_col + 1)]
-                        row_data = dict(zip(headers, row_values))
-                        if not any(row_data.values()):
-                            continue
-
-                        compound_fk_data = defaultdict(dict)
-                        simple_fields = {}
-
-                        for field_name, value in row_data.items():
-                            if '\n' in field_name:
-                                fk_field, subfield = field_name.split('\n', 1)
-                                compound_fk_data[fk_field][subfield] = value
-                            else:
-                                simple_fields[field_name] = value
-
-                        data = {}
-                        for field_name, value in simple_fields.items():
-                            if field_name not in model_fields:
-                                if issubclass(model, MP_Node) and field_name == 'parent':
-                                    # Resolve parent FK instance
-                                    if value is not None:
-                                        parent_instance = model.objects.get_by_natural_key(value)
-                                    else:
-                                        parent_instance = None
-                                    data[field_name] = parent_instance
-                                    continue
-
-                            field = model_fields[field_name]
-                            data[field_name] = get_cleaned_field_value(field, value, self.choice_maps)
-
-                        for fk_field, subfield_map in compound_fk_data.items():
-                            if fk_field not in model_fields:
-                                continue
-                            field = model_fields[fk_field]
-                            related_model = field.remote_field.model
-
-                            if hasattr(related_model.objects, 'get_by_natural_key'):
-                                try:
-                                    code_obj = related_model.objects.get_by_natural_key.__code__
-                                    key_fields = list(code_obj.co_varnames[:code_obj.co_argcount])[1:]  # skip 'self'
-                                except Exception as e:
-                                    error_details = traceback.format_exc()
-                                    results["failures"].append(f"Could not introspect get_by_natural_key() for {related_model.__name__} – {e}\n{error_details}")
-                            else:
-                                raise ValueError(f"{related_model.__name__} must implement get_by_natural_key()")
-
-                            key_values = [subfield_map.get(k) for k in key_fields]
-
-                            if all(v is None for v in key_values):
-                                if not field.null:
-                                    raise ValueError(
-                                        f"Field '{fk_field}' does not allow null values and no data was provided.")
-                                data[fk_field] = None
-                                continue
-                            elif any(v is None for v in key_values):
-                                raise ValueError(f"Partial values for compound FK '{fk_field}': {key_values}")
-
-                            data[fk_field] = resolve_foreign_key(field, key_values, self.choice_maps)
-
-                        try:
-                            lookup_fields = model.objects.get_by_natural_key.__code__.co_varnames[
-                                            1:model.objects.get_by_natural_key.__code__.co_argcount]
-                        except Exception as e:
-                            error_details = traceback.format_exc()
-                            results["failures"].append(f"Could not determine natural key for model {model.__name__} – {e}\n{error_details}")
-
-                        lookup_data = {
-                            field: data.get(field)
-                            for field in lookup_fields
-                        }
-                        if any(value is None for value in lookup_data.values()):
-                            continue
+            if self.workers > 1 and not self.dry_run:
+                self._import_levels_in_parallel(reader, levels, results)
+            else:
+                for level in levels:
+                    for current_model in level:
+                        self._import_model(reader, current_model, results)
+                current_model = None
+
+            if self.workbook_hash and not results["failures"]:
+                # Everything is committed, nothing left to resume
+                self.state_store.clear_checkpoint()
+
+        except Exception as e:
+            error_details = traceback.format_exc()
+            if current_model is None:
+                results["failures"].append(f"Import failed – {e}\n{error_details}")
+            else:
+                results["failures"].append(f"Model name: {current_model.__name__} – {e}\n{error_details}")
+        finally:
+            if reader is not None:
+                reader.close()
+            if bulk_load:
+                # Indexes and settings are restored whether or not the import succeeded
+                with self.stats.phase('index_rebuild'):
+                    bulk_load.finish()
+
+    def _get_selected_models(self, app_config, reader):
+        selected = set()
+        for model_name in self.models:
+            try:
+                model = app_config.get_model(model_name)
+            except LookupError:
+                raise ValueError(f"App '{self.app_label}' has no model named '{model_name}'.")
+            if model.__name__ not in reader.sheet_names:
+                raise ValueError(f"The source has no sheet for model '{model.__name__}'.")
+            selected.add(model)
+        return selected
+
+    def _open_reader(self):
+        return get_reader(self.full_path, read_only=self.read_only, name=self.source_name)
+
+    def _import_model(self, reader, model, results):
+        model_name = model.__name__
+        if model_name not in reader.sheet_names:
+            return
+        if model_name in self.completed_sheets:
+            results["successes"].append(f"Model name: {model_name}: already committed, skipped on resume")
+            return
+        fingerprint = self._get_fingerprint(reader, model, results)
+        if fingerprint is False:
+            return
+
+        with self.stats.sheet(model_name) as sheet_stats:
+            self._import_sheet(reader, model, results)
+        if self.query_budget is not None:
+            self._check_query_budget(sheet_stats)
+        if fingerprint:
+            self.state_store.save_fingerprint(self._get_fingerprint_key(model), fingerprint)
+
+    def _get_fingerprint(self, reader, model, results):
+        # The sheet's fingerprint to store once it's imported, None when sheets aren't fingerprinted,
+        # or False if it matches the stored one and the sheet is skipped
+        if not (self.skip_unchanged and self.state_store):
+            return None
+        model_name = model.__name__
+        with self.stats.phase('fingerprint'):
+            fingerprint = reader.get_sheet_fingerprint(model_name)
+            # A matching fingerprint only proves the sheet is unchanged, so the table must still hold rows
+            # (e.g. not after a database reset) for the import to be skipped
+            unchanged = (
+                fingerprint and fingerprint == self.state_store.get_fingerprint(self._get_fingerprint_key(model))
+                and model._default_manager.exists()
+            )
+        if unchanged:
+            results["successes"].append(f"Model name: {model_name}: unchanged since the last import, skipped")
+            return False
+        return fingerprint
+
+    def _get_fingerprint_key(self, model):
+        # Fingerprints are kept per database, so importing into another one never skips sheets
+        using = router.db_for_write(model)
+        return f"{using}:{connections[using].settings_dict['NAME']}:{model._meta.label}"
+
+    def _check_query_budget(self, sheet_stats):
+        budget = self.query_budget * sheet_stats['rows'] + self.query_budget_allowance
+        if sheet_stats['queries'] <= budget:
+            return
+        # Converter phases ('fk account', 'mp parent', ...) and write phases, most queries first
+        sources = sorted(
+            ((name, phase['queries']) for name, phase in sheet_stats['phases'].items() if phase['queries']),
+            key=lambda item: -item[1]
+        )
+        message = (
+            f"{sheet_stats['queries']} queries for {sheet_stats['rows']} rows exceeds the query budget of "
+            f"{self.query_budget} per row + {self.query_budget_allowance} "
+            f"({', '.join(f'{name}: {count}' for name, count in sources)})"
+        )
+        if self.on_query_budget == 'raise':
+            # Reported as "Model name: X – ..." by the import's failure handling
+            raise ValueError(message)
+        warnings.warn(f"Model name: {sheet_stats['model']}: {message}", RuntimeWarning)
+
+    def _import_sheet(self, reader, model, results):
+        model_name = model.__name__
+        with self.stats.phase('read'):
+            sheet = reader.read_sheet(model_name)
+        if not sheet:
+            return
+        headers, numbered_rows = sheet
+
+        with self.stats.phase('plan'):
+            plan = self._get_import_plan(model, headers)
+
+        created_count = 0
+        updated_count = 0
+        writer = None
+        if self.bulk and plan.is_mp_node:
+            writer = MPNodeBulkLoader(model, plan.lookup_fields, batch_size=self.batch_size)
+        elif self.bulk or (self.delta and not plan.is_mp_node):
+            writer = BulkUpsertWriter(
+                model, plan.lookup_fields, batch_size=self.batch_size, skip_unchanged=self.delta
+            )
+
+        resume_row = None
+        if self.checkpoint and self.checkpoint['sheet'] == model_name:
+            resume_row = self.checkpoint['row']
+            numbered_rows = ((row_number, row_values) for row_number, row_values in numbered_rows
+                             if row_number > resume_row)
+
+        decode = plan.decode
+        if self.pipeline and not self.dry_run:
+            with self.stats.phase('plan'):
+                numbered_rows, decode = self._get_pipeline(plan, numbered_rows)
+        else:
+            numbered_rows = self.stats.timed_iter(
+                plan.iter_prepared(self.stats.timed_iter(numbered_rows, 'read'), self.batch_size), 'prepare'
+            )
+
+        if self.dry_run:
+            with self.stats.phase('validate'):
+                self._validate_rows(model, plan, numbered_rows, results)
+            return
+
+        # The bulk tree loader needs the whole sheet to place nodes, so its sheet is always one chunk
+        chunk_size = None if writer and plan.is_mp_node else self.chunk_size
+
+        read_ahead_decode = None
+        if self.read_before_write and not plan.needs_connection:
+            # MP_Node parents looked up while writing may be earlier rows of the chunk, so those decode in it
+            read_ahead_decode, decode = decode, None
+
+        write_phase = 'tree_insert' if plan.is_mp_node and not writer else 'write'
+        flush_phase = 'tree_insert' if plan.is_mp_node else 'flush'
+        row_count = 0
+
+        for chunk in _iter_chunks(numbered_rows, chunk_size):
+            last_row = None
+            if self.read_before_write:
+                chunk = self._read_chunk(chunk, numbered_rows, read_ahead_decode)
+            # 'commit' only keeps the time not spent in the phases nested inside the transaction
+            with self.stats.phase('commit'), transaction.atomic():
+                rows = iter(chunk)
+                for row_number, row_values in rows:
+                    last_row = row_number
+                    if row_values.__class__ is InvalidRow:
+                        _raise_invalid_rows([(row_number, row_values.errors)], chain(rows, numbered_rows))
+                    # Rows are decoded as they are written: MP_Node parents may be earlier rows of this chunk
+                    if decode:
+                        with self.stats.phase('decode'):
+                            data = decode(row_values)
+                    else:
+                        data = row_values
+                    if data is None:
+                        continue
+
+                    lookup_data = plan.get_lookup_data(data)
+                    if lookup_data is None:
+                        continue
+                    row_count += 1
+                    if row_count % self.batch_size == 0:
+                        self.stats.notify('rows', {'model': model_name, 'rows': row_count})
 
-                        if not issubclass(model, MP_Node):
+                    with self.stats.phase(write_phase):
+                        if writer:
+                            writer.add(lookup_data, data)
+                        elif not plan.is_mp_node:
                             obj, created = model.objects.update_or_create(
                                 defaults=data,
                                 **lookup_data
@@ -165,28 +348,286 @@ class ImportWorkbook:
                             else:
                                 updated_count += 1
 
-                results["successes"].append(f"Model name: {model_name}: {created_count} created, {updated_count} updated")
+                if writer:
+                    with self.stats.phase(flush_phase):
+                        writer.flush()
 
-        except Exception as e:
-            error_details = traceback.format_exc()
-            results["failures"].append(f"Model name: {model.__name__} – {e}\n{error_details}")
+            if self.workbook_hash and chunk_size and last_row is not None:
+                with self.stats.phase('checkpoint'):
+                    self.state_store.save_checkpoint(self.workbook_hash, model_name, last_row, self.completed_sheets)
+            self.stats.notify('chunk', {'model': model_name, 'rows': row_count, 'last_row': last_row})
 
-        return results
+        self.stats.add_rows(row_count)
+
+        if writer:
+            created_count = writer.created_count
+            updated_count = writer.updated_count
 
-    def _validate_app_label(self, wb):
-        if '_app' in wb.defined_names:
-            app_def = wb.defined_names.get('_app')
-            if app_def:
-                defined_app_label = app_def.attr_text.strip('"')
+        if self.workbook_hash:
+            self.completed_sheets.append(model_name)
+            self.state_store.save_checkpoint(self.workbook_hash, None, None, self.completed_sheets)
 
-            if defined_app_label and defined_app_label != self.app_label:
-                raise ValueError(f"Workbook _app name '{defined_app_label}' doesn't match provided app_label '{self.app_label}'.")
+        # Rows for this model now exist, so later sheets must reload its keys
+        self.key_cache.invalidate(model)
+        summary = f"Model name: {model_name}: {created_count} created, {updated_count} updated"
+        if self.delta and isinstance(writer, BulkUpsertWriter):
+            summary += f", {writer.unchanged_count} unchanged"
+        if resume_row:
+            summary += f" (resumed after row {resume_row})"
+        results["successes"].append(summary)
 
-    def _get_model_fields(self, model):
-        field_map = {}
-        for field in model._meta.fields:
-            if issubclass(model, MP_Node) and field.name in MP_NODE_AUTO_FIELDS:
+    def _read_chunk(self, chunk, numbered_rows, decode):
+        # The chunk's rows as a list, decoded if decode is given; an invalid row fails the sheet here,
+        # before its transaction starts
+        rows = []
+        chunk = iter(chunk)
+        for row_number, row_values in chunk:
+            if row_values.__class__ is InvalidRow:
+                _raise_invalid_rows([(row_number, row_values.errors)], chain(chunk, numbered_rows))
+            if decode:
+                with self.stats.phase('decode'):
+                    row_values = decode(row_values)
+            rows.append((row_number, row_values))
+        return rows
+
+    def _get_pipeline(self, plan, numbered_rows):
+        # Returns the pipelined rows and the decode step left to the writer, if any
+        if self.query_budget is not None:
+            # Key resolution is traced for the query budget on this thread's stats, so only reading
+            # overlaps with writes
+            pipeline = RowPipeline(numbered_rows, batch_size=self.batch_size, queue_size=self.queue_size)
+            return self.stats.timed_iter(
+                plan.iter_prepared(self.stats.timed_iter(pipeline, 'read'), self.batch_size), 'prepare'
+            ), plan.decode
+        # Keys are loaded on this thread's connection so the producer prepares rows from memory; decoding
+        # stays here if it queries the database
+        plan.preload_keys()
+        decode = None if plan.needs_connection else plan.decode
+        pipeline = RowPipeline(
+            plan.iter_prepared(numbered_rows, self.batch_size), decode,
+            batch_size=self.batch_size, queue_size=self.queue_size
+        )
+        # Reading and preparing rows run on the producer thread; this thread only waits for its batches
+        return self.stats.timed_iter(pipeline, 'read'), plan.decode if decode is None else None
+
+    def _validate_rows(self, model, plan, numbered_rows, results):
+        model_name = model.__name__
+        would_create = 0
+        would_update = 0
+        invalid_rows = []
+        # natural key -> first row it appears on
+        sheet_keys = {}
+        # MP_Node rows are counted once their parent reference has been checked against the whole sheet
+        tree_rows = []
+
+        for row_number, row_values in numbered_rows:
+            if isinstance(row_values, InvalidRow):
+                invalid_rows.append((row_number, row_values.errors))
+                continue
+            try:
+                data = plan.decode(row_values)
+                if data is None:
+                    continue
+                if plan.get_lookup_data(data) is None:
+                    raise ValueError(f"Missing natural key value for {', '.join(plan.lookup_fields)}")
+                key = self.key_cache.get_key_from_data(model, data)
+                parent_key = None
+                if plan.is_mp_node and data.get('parent') is not None:
+                    parent_key = self.key_cache.make_key(model, [data['parent']])
+            except Exception as e:
+                invalid_rows.append((row_number, [str(e)]))
                 continue
-            if isinstance(field, models.Field) and not field.auto_created:
-                field_map[field.name] = field
-        return field_map
+
+            exists = key in sheet_keys or self.key_cache.contains(model, key)
+            sheet_keys.setdefault(key, row_number)
+            if plan.is_mp_node:
+                tree_rows.append((row_number, parent_key, exists))
+            elif exists:
+                would_update += 1
+            else:
+                would_create += 1
+
+        for row_number, parent_key, exists in tree_rows:
+            if parent_key is not None and not self.key_cache.contains(model, parent_key):
+                parent_row = sheet_keys.get(parent_key)
+                # add_child() needs the parent first; the bulk tree loader orders rows itself
+                if parent_row is None or (not self.bulk and parent_row >= row_number):
+                    invalid_rows.append((
+                        row_number,
+                        [f"parent {list(parent_key)} not found" + ("" if parent_row is None else f" before row {row_number}")]
+                    ))
+                    continue
+            if exists:
+                would_update += 1
+            else:
+                would_create += 1
+
+        self.stats.add_rows(would_create + would_update + len(invalid_rows))
+
+        # Later sheets can reference rows that only exist in this workbook
+        for key in sheet_keys:
+            self.key_cache.add_pending(model, key)
+
+        results["successes"].append(
+            f"Model name: {model_name}: {would_create} would be created, {would_update} would be updated, "
+            f"{len(invalid_rows)} invalid rows"
+        )
+        results["failures"].extend(f"Model name: {model_name} {line}" for line in _group_invalid_rows(invalid_rows))
+
+    def _import_levels_in_parallel(self, reader, levels, results):
+        # Workers commit on their own connections, which an enclosing transaction can't roll back, and
+        # closing its connection would break it
+        if any(connection.in_atomic_block for connection in connections.all(initialized_only=True)):
+            raise ValueError("Parallel workers can't be used inside a transaction (atomic block).")
+        # Workers fork/spawn their own connections; never hand them an open parent connection
+        connections.close_all()
+        options = {
+            'read_only': True, 'bulk': self.bulk, 'batch_size': self.batch_size, 'delta': self.delta,
+            'pipeline': self.pipeline, 'queue_size': self.queue_size, 'trace_memory': self.stats.trace_memory,
+            'query_budget': self.query_budget, 'query_budget_allowance': self.query_budget_allowance,
+            'on_query_budget': self.on_query_budget, 'sqlite_bulk_load': self.sqlite_bulk_load
+        }
+
+        with ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_init_import_worker,
+            initargs=(self.full_path, self.source_name)
+        ) as executor:
+            for level in levels:
+                # A level only depends on earlier levels, so its sheets run concurrently
+                fingerprints = {
+                    model: self._get_fingerprint(reader, model, results)
+                    for model in level if model.__name__ in reader.sheet_names
+                }
+                futures = [
+                    (model, executor.submit(
+                        _import_model_in_worker, self.full_path, self.app_label, model.__name__, options
+                    ))
+                    for model, fingerprint in fingerprints.items() if fingerprint is not False
+                ]
+                for model, _ in futures:
+                    # Workers can't call back into this process, so progress is reported per sheet only
+                    self.stats.notify('sheet_started', {'model': model.__name__})
+                level_failed = False
+                for model, future in futures:
+                    try:
+                        worker_results = future.result()
+                    except Exception as e:
+                        error_details = traceback.format_exc()
+                        worker_results = {
+                            "successes": [],
+                            "failures": [f"Model name: {model.__name__} – {e}\n{error_details}"]
+                        }
+                    for sheet_stats in worker_results.get("stats", {}).get("sheets", {}).values():
+                        self.stats.merge_sheet(sheet_stats)
+                    results["successes"].extend(worker_results["successes"])
+                    results["failures"].extend(worker_results["failures"])
+                    level_failed = level_failed or bool(worker_results["failures"])
+                    if fingerprints[model] and not worker_results["failures"]:
+                        # Fingerprints are only written here, so workers never race on the state file
+                        self.state_store.save_fingerprint(self._get_fingerprint_key(model), fingerprints[model])
+                if level_failed:
+                    # Later levels depend on this one, so stop as the sequential import would
+                    break
+
+    def _get_import_plan(self, model, headers):
+        # Plans are compiled once per model and reused while the headers stay the same
+        plan = self.import_plans.get(model)
+        if plan is None or plan.headers != tuple(headers):
+            plan = ImportPlan(
+                model, headers, self.choice_maps, self.key_cache, resolve_mp_parent=not (self.bulk or self.dry_run)
+            )
+            if self.query_budget is not None:
+                plan.trace_converters(self.stats.phase)
+            self.import_plans[model] = plan
+        return plan
+
+
+def get_default_state_path(app_label):
+    # Relative to the working directory, like the app's import workbook
+    return Path(app_label) / 'media' / 'import_export' / 'state' / f"{app_label}_import_state.json"
+
+
+def _iter_chunks(numbered_rows, chunk_size):
+    # Without a chunk size the whole sheet is a single chunk and is streamed, never materialised
+    if not chunk_size:
+        yield numbered_rows
+        return
+    while True:
+        chunk = list(islice(numbered_rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _group_invalid_rows(invalid_rows):
+    # One line per distinct error, e.g. an unknown foreign key, with the rows it affects. A row with
+    # several errors (say, four unknown foreign keys) counts towards each of them
+    rows_by_error = {}
+    for row_number, errors in invalid_rows:
+        for error in errors:
+            rows_by_error.setdefault(error, []).append(row_number)
+    lines = []
+    for error, row_numbers in rows_by_error.items():
+        if len(row_numbers) == 1:
+            lines.append(f"row {row_numbers[0]} – {error}")
+            continue
+        shown = ', '.join(str(row_number) for row_number in row_numbers[:INVALID_ROW_NUMBERS_SHOWN])
+        if len(row_numbers) > INVALID_ROW_NUMBERS_SHOWN:
+            shown += f" and {len(row_numbers) - INVALID_ROW_NUMBERS_SHOWN} more"
+        lines.append(f"rows {shown} – {error} ({len(row_numbers)} rows)")
+    return lines
+
+
+def _raise_invalid_rows(invalid_rows, remaining_rows):
+    # The sheet fails either way, so the rest of it is only scanned for invalid rows, which are reported
+    # together instead of stopping at the first one
+    for row_number, row_values in remaining_rows:
+        if row_values.__class__ is InvalidRow:
+            invalid_rows.append((row_number, row_values.errors))
+    count = len(invalid_rows)
+    raise ValueError(
+        f"{count} invalid row{'' if count == 1 else 's'}\n" + "\n".join(_group_invalid_rows(invalid_rows))
+    )
+
+
+def _init_import_worker(full_path, source_name):
+    global _worker_reader
+    # Spawned workers start with an unconfigured Django; forked ones already have the app registry
+    if not apps.ready:
+        django.setup()
+    for connection in connections.all(initialized_only=False):
+        if connection.vendor == 'sqlite':
+            # SQLite allows a single writer and fails a deferred transaction that has to upgrade its lock,
+            # so workers take the write lock when the sheet transaction starts and queue for it instead
+            options = connection.settings_dict['OPTIONS']
+            options.setdefault('transaction_mode', 'IMMEDIATE')
+            options.setdefault('timeout', SQLITE_WORKER_LOCK_TIMEOUT)
+    # Opened once per worker and read by every sheet it imports; it's closed when the worker exits
+    _worker_reader = get_reader(full_path, read_only=True, name=source_name)
+
+
+def _import_model_in_worker(full_path, app_label, model_name, options):
+    importer = ImportWorkbook(full_path, app_label, **options)
+    model = apps.get_model(app_label, model_name)
+    # The sheet transaction takes SQLite's write lock as it starts, so the sheet is read before it
+    importer.read_before_write = connections[router.db_for_write(model)].vendor == 'sqlite'
+    results = {
+        "successes": [],
+        "failures": []
+    }
+    # Each worker tunes its own connection; the journal mode and deferred indexes belong to the parent
+    bulk_load = SQLiteBulkLoadSession(journal_mode=None) if importer.sqlite_bulk_load else None
+    try:
+        if bulk_load:
+            bulk_load.start()
+        with importer.stats:
+            importer._import_model(_worker_reader, model, results)
+    except Exception as e:
+        error_details = traceback.format_exc()
+        results["failures"].append(f"Model name: {model_name} – {e}\n{error_details}")
+    finally:
+        if bulk_load:
+            bulk_load.finish()
+        connections.close_all()
+    results["stats"] = importer.stats.as_dict()
+    return results
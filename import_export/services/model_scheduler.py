@@ -0,0 +1,45 @@
+class ModelScheduler:
+    """
+    Orders an app's models so every model is imported after the models its foreign keys point to.
+
+    Models are grouped into levels: models within a level have no dependency on each other, and
+    each level only depends on earlier levels. Self-references (including the MP_Node parent) are
+    resolved within the model's own sheet, so they don't count as dependencies.
+    """
+
+    def __init__(self, models):
+        self.models = list(models)
+        self.dependencies = self._build_dependencies()
+
+    def get_levels(self):
+        remaining = {model: set(deps) for model, deps in self.dependencies.items()}
+        levels = []
+        while remaining:
+            # Keep declaration order within a level so imports stay deterministic
+            level = [model for model in self.models if model in remaining and not remaining[model]]
+            if not level:
+                cycle = ", ".join(model.__name__ for model in self.models if model in remaining)
+                raise ValueError(f"Circular foreign key dependency between models: {cycle}")
+            levels.append(level)
+            for model in level:
+                del remaining[model]
+            for deps in remaining.values():
+                deps.difference_update(level)
+        return levels
+
+    def get_ordered_models(self):
+        return [model for level in self.get_levels() for model in level]
+
+    def _build_dependencies(self):
+        in_scope = set(self.models)
+        dependencies = {}
+        for model in self.models:
+            deps = set()
+            for field in model._meta.fields:
+                if field.is_relation and (field.many_to_one or field.one_to_one):
+                    related_model = field.remote_field.model
+                    # MP_Node parents live in the same table, and models outside the app are assumed loaded
+                    if related_model is not model and related_model in in_scope:
+                        deps.add(related_model)
+            dependencies[model] = deps
+        return dependencies
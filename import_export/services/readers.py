@@ -0,0 +1,342 @@
+import codecs
+import csv
+import hashlib
+import io
+import json
+import mmap
+import re
+from contextlib import contextmanager
+from itertools import chain
+from pathlib import Path
+from openpyxl import load_workbook
+from openpyxl.utils import range_boundaries
+from import_export.utils.workbook_helpers import get_file_hash, get_sheet_tables
+
+# A worksheet cell, e.g. <c r="B4" s="3" t="s"><v>34</v></c>, its attributes and its value
+CELL_PATTERN = re.compile(rb'<c\b([^>]*?)(?:/>|>(.*?)</c>)', re.DOTALL)
+CELL_ATTRIBUTE_PATTERN = re.compile(rb'\s([rst])="([^"]*)"')
+CELL_VALUE_PATTERN = re.compile(rb'<v>([^<]*)</v>')
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+
+class BaseReader:
+    """
+    Source of model rows for ImportWorkbook. A reader exposes one sheet per model, each made of a header
+    row using the template's header convention (multi-line 'fk\\nsubfield' headers for compound keys)
+    and an iterator of (row_number, values) tuples. Cleaning, FK resolution and writing are shared by
+    every reader.
+    """
+
+    sheet_names = ()
+
+    def read_sheet(self, model_name):
+        # (headers, numbered_rows) for a model, or None if the source has no rows for it
+        raise NotImplementedError
+
+    def validate_app_label(self, app_label):
+        pass
+
+    def get_source_hash(self):
+        raise NotImplementedError
+
+    def get_sheet_fingerprint(self, model_name):
+        # Hash of a sheet's headers and cell values, or None if the source has no rows for the model
+        sheet = self.read_sheet(model_name)
+        if not sheet:
+            return None
+        headers, numbered_rows = sheet
+        digest = hashlib.sha256(repr(list(headers)).encode())
+        for _, values in numbered_rows:
+            digest.update(repr(tuple(values)).encode())
+        return digest.hexdigest()
+
+    def close(self):
+        pass
+
+
+class XlsxReader(BaseReader):
+    """Reads the Excel Table named after each model, as laid out by ImportTemplateBuilder."""
+
+    def __init__(self, path, read_only=False):
+        # A path, or a seekable binary buffer that openpyxl reads the archive from in place
+        self.path = path
+        self.read_only = read_only
+        if is_buffer(path):
+            path.seek(0)
+        if isinstance(path, mmap.mmap):
+            path = _MmapFile(path)
+        self.workbook = load_workbook(path, data_only=True, read_only=read_only)
+        self.sheet_names = self.workbook.sheetnames
+
+    def read_sheet(self, model_name):
+        if model_name not in self.sheet_names:
+            return None
+        sheet = self.workbook[model_name]
+        table = get_sheet_tables(sheet).get(model_name)
+        if not table:
+            return None
+
+        min_col, min_row, max_col, max_row = range_boundaries(table.ref)
+        data_end_row = max_row - (1 if table.totalsRowCount else 0)
+        # Only the rows inside the table ref are read; iter_rows streams them in read-only mode
+        rows = sheet.iter_rows(
+            min_row=min_row, max_row=data_end_row, min_col=min_col, max_col=max_col, values_only=True
+        )
+        headers = list(next(rows))
+        return headers, enumerate(rows, start=min_row + 1)
+
+    def get_sheet_fingerprint(self, model_name):
+        if not self.read_only:
+            # The whole workbook is already in memory, so hashing its cell values is cheap
+            return super().get_sheet_fingerprint(model_name)
+        if model_name not in self.sheet_names:
+            return None
+        sheet = self.workbook[model_name]
+        table = get_sheet_tables(sheet).get(model_name)
+        if not table:
+            return None
+
+        # Parsing the sheet here would parse it twice when it changed, so its worksheet XML is hashed instead.
+        # Shared string indexes and style ids depend on the rest of the workbook, so each cell is hashed
+        # with its string and whether its style makes it a date, keeping other sheets' edits out of it
+        digest = hashlib.sha256(table.ref.encode())
+        normalize_cell = self._get_cell_normalizer(sheet)
+        pending = b''
+        with sheet._get_source() as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                pending += chunk
+                # Only whole rows are hashed, so no cell is split between chunks
+                end = pending.rfind(b'</row>')
+                if end != -1:
+                    end += len(b'</row>')
+                    digest.update(CELL_PATTERN.sub(normalize_cell, pending[:end]))
+                    pending = pending[end:]
+        digest.update(CELL_PATTERN.sub(normalize_cell, pending))
+        return digest.hexdigest()
+
+    def _get_cell_normalizer(self, sheet):
+        shared_strings = sheet._shared_strings
+        date_formats = self.workbook._date_formats
+        timedelta_formats = self.workbook._timedelta_formats
+
+        def normalize_cell(match):
+            attributes = dict(CELL_ATTRIBUTE_PATTERN.findall(match[1]))
+            content = match[2] or b''
+            cell_type = attributes.get(b't', b'')
+            if cell_type == b's':
+                index = CELL_VALUE_PATTERN.search(content)
+                content = str(shared_strings[int(index[1])]).encode() if index else b''
+            style = int(attributes.get(b's', 0))
+            style_kind = b'd' if style in date_formats else b't' if style in timedelta_formats else b''
+            return b'<c %s %s %s>%s</c>' % (attributes.get(b'r', b''), cell_type, style_kind, content)
+        return normalize_cell
+
+    def validate_app_label(self, app_label):
+        wb = self.workbook
+        if '_app' in wb.defined_names:
+            app_def = wb.defined_names.get('_app')
+            if app_def:
+                defined_app_label = app_def.attr_text.strip('"')
+
+            if defined_app_label and defined_app_label != app_label:
+                raise ValueError(f"Workbook _app name '{defined_app_label}' doesn't match provided app_label '{app_label}'.")
+
+    def get_source_hash(self):
+        return get_file_hash(self.path)
+
+    def close(self):
+        if self.read_only:
+            # Read-only workbooks keep the archive open until closed
+            self.workbook.close()
+
+
+class FileReader(BaseReader):
+    """
+    Base for formats holding a single model per file, named <ModelName>.<extension>. The file can also be
+    a binary buffer, with the model taken from `name` (e.g. an upload's file name).
+    """
+
+    def __init__(self, path, name=None):
+        self.path = path if is_buffer(path) else Path(path)
+        self.model_name = Path(name).stem if name else self.path.stem
+        self.sheet_names = [self.model_name]
+
+    def read_sheet(self, model_name):
+        if model_name != self.model_name:
+            return None
+        rows = self.iter_rows()
+        try:
+            headers = list(next(rows))
+        except StopIteration:
+            return None
+        return headers, rows
+
+    def iter_rows(self):
+        # The header row first, then (row_number, values) tuples
+        raise NotImplementedError
+
+    def get_source_hash(self):
+        return get_file_hash(self.path)
+
+    def get_sheet_fingerprint(self, model_name):
+        # The file holds nothing but this model's rows, so hashing its bytes avoids parsing it twice
+        return get_file_hash(self.path) if model_name == self.model_name else None
+
+    @contextmanager
+    def open_text(self, encoding):
+        # Buffers are decoded a line at a time as they're read, so an upload or mmap is never copied whole
+        if not is_buffer(self.path):
+            with open(self.path, newline='', encoding=encoding) as f:
+                yield f
+            return
+        self.path.seek(0)
+        yield _iter_text_lines(self.path, encoding)
+
+
+class CsvReader(FileReader):
+    extension = '.csv'
+
+    def iter_rows(self):
+        with self.open_text('utf-8-sig') as f:
+            reader = csv.reader(f)
+            headers = next(reader, None)
+            if headers is None:
+                return
+            yield headers
+            for values in reader:
+                # Empty cells are blank in a workbook too; line_num points at the row's last line
+                yield reader.line_num, tuple(value if value != '' else None for value in values) \
+                    + (None,) * (len(headers) - len(values))
+
+
+class JsonLinesReader(FileReader):
+    extension = '.jsonl'
+
+    def iter_rows(self):
+        with self.open_text('utf-8') as f:
+            headers = None
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if headers is None:
+                    # Headers come from the first record's keys, in order
+                    headers = list(record)
+                    yield headers
+                yield line_number, tuple(record.get(header) for header in headers)
+
+
+class ParquetReader(FileReader):
+    extension = '.parquet'
+
+    def __init__(self, path, name=None, batch_size=10000):
+        if pq is None:
+            raise ImportError("Reading Parquet files requires pyarrow: pip install pyarrow")
+        super().__init__(path, name=name)
+        self.batch_size = batch_size
+
+    def iter_rows(self):
+        source = self.path
+        if isinstance(source, mmap.mmap):
+            # Read in place rather than through Python file calls
+            source = pa.BufferReader(source)
+        elif isinstance(source, io.BytesIO):
+            source = pa.BufferReader(source.getbuffer())
+        elif is_buffer(source):
+            source.seek(0)
+        parquet_file = pq.ParquetFile(source)
+        yield parquet_file.schema_arrow.names
+        row_number = 0
+        # Record batches keep memory bounded however many rows the file holds
+        for batch in parquet_file.iter_batches(batch_size=self.batch_size):
+            for values in zip(*(column.to_pylist() for column in batch.columns)):
+                row_number += 1
+                yield row_number, values
+
+
+FILE_READERS = {reader.extension: reader for reader in (CsvReader, JsonLinesReader, ParquetReader)}
+
+
+class DirectoryReader(BaseReader):
+    """A directory of per-model extracts, e.g. FinancialData.parquet next to Account.csv."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.readers = {}
+        for file_path in sorted(self.path.iterdir()):
+            reader_class = FILE_READERS.get(file_path.suffix.lower())
+            if reader_class and file_path.stem not in self.readers:
+                self.readers[file_path.stem] = reader_class(file_path)
+        self.sheet_names = list(self.readers)
+
+    def read_sheet(self, model_name):
+        reader = self.readers.get(model_name)
+        return reader.read_sheet(model_name) if reader else None
+
+    def get_sheet_fingerprint(self, model_name):
+        reader = self.readers.get(model_name)
+        return reader.get_sheet_fingerprint(model_name) if reader else None
+
+    def get_source_hash(self):
+        digest = hashlib.sha256()
+        for model_name, reader in self.readers.items():
+            digest.update(f"{reader.path.name}:{reader.get_source_hash()}".encode())
+        return digest.hexdigest()
+
+
+def is_buffer(source):
+    # In-memory sources: bytes, or file-like objects such as an UploadedFile, BytesIO or mmap
+    return isinstance(source, (bytes, bytearray, memoryview)) or hasattr(source, 'read')
+
+
+def get_reader(source, read_only=False, name=None):
+    if is_buffer(source):
+        return _get_buffer_reader(source, read_only, name)
+    path = Path(source)
+    if path.is_dir():
+        return DirectoryReader(path)
+    reader_class = FILE_READERS.get(path.suffix.lower())
+    if reader_class:
+        return reader_class(path)
+    return XlsxReader(source, read_only=read_only)
+
+
+def _get_buffer_reader(source, read_only, name):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    # CSV, JSONL and Parquet buffers are recognised, and their model named, by the file name; anything
+    # else is read as a workbook
+    name = name or getattr(source, 'name', None)
+    reader_class = FILE_READERS.get(Path(name).suffix.lower()) if isinstance(name, str) else None
+    if reader_class:
+        return reader_class(source, name=name)
+    return XlsxReader(source, read_only=read_only)
+
+
+class _MmapFile:
+    # zipfile checks seekable(), which mmap objects only have from Python 3.13
+    def __init__(self, mapped):
+        self.mapped = mapped
+
+    def __getattr__(self, name):
+        return getattr(self.mapped, name)
+
+    def seekable(self):
+        return True
+
+
+def _iter_text_lines(buffer, encoding):
+    first_line = buffer.readline()
+    if isinstance(first_line, str):
+        # Already text, e.g. a StringIO
+        yield first_line
+        yield from iter(buffer.readline, '')
+        return
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for line in chain((first_line,), iter(buffer.readline, b'')):
+        yield decoder.decode(line)
@@ -0,0 +1,80 @@
+import queue
+import threading
+from django.db import connections
+from import_export.utils.column_coercion import InvalidRow
+
+# Seconds the producer waits on a full queue before checking whether the writer has stopped
+PUT_TIMEOUT = 0.1
+
+_DONE = object()
+
+
+class RowPipeline:
+    """
+    Overlaps reading and decoding a sheet with writing it. A producer thread reads rows, decodes them
+    and puts batches of (row_number, data) on a bounded queue; iterating the pipeline in the thread that
+    owns the database connection yields them in sheet order. A full queue blocks the producer, so at most
+    queue_size batches are held in memory however large the sheet is.
+
+    Decode errors are raised by the iterator at the row that caused them, so a failing row rolls back the
+    surrounding transaction exactly as it would without the pipeline. Rows that already failed preparation
+    (InvalidRow) are passed through undecoded, for the writer to report with the sheet's other invalid rows.
+    """
+
+    def __init__(self, numbered_rows, decode=None, batch_size=1000, queue_size=4):
+        self.numbered_rows = numbered_rows
+        # None leaves decoding to the consumer, e.g. when converters need the database connection
+        self.decode = decode
+        self.batch_size = batch_size
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stopped = threading.Event()
+
+    def __iter__(self):
+        producer = threading.Thread(target=self._produce, daemon=True)
+        producer.start()
+        try:
+            while True:
+                item = self.queue.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield from item
+        finally:
+            # Unblocks the producer if the consumer stops early, e.g. on a failed write
+            self.stopped.set()
+            producer.join()
+
+    def _produce(self):
+        batch = []
+        try:
+            for row_number, row_values in self.numbered_rows:
+                if self.stopped.is_set():
+                    return
+                try:
+                    if self.decode and row_values.__class__ is not InvalidRow:
+                        row_values = self.decode(row_values)
+                    batch.append((row_number, row_values))
+                except Exception as e:
+                    # Rows before the failing one are still written, then the error is raised in order
+                    self._put(batch)
+                    self._put(e)
+                    return
+                if len(batch) >= self.batch_size:
+                    self._put(batch)
+                    batch = []
+            self._put(batch)
+            self._put(_DONE)
+        except Exception as e:
+            self._put(e)
+        finally:
+            # Anything the producer touched in the database used this thread's own connection
+            connections.close_all()
+
+    def _put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=PUT_TIMEOUT)
+                return
+            except queue.Full:
+                continue
@@ -0,0 +1,114 @@
+import datetime
+from decimal import Decimal, InvalidOperation
+from django.db import models
+
+TRUE_VALUES = {'true', 't', 'yes', 'y', '1'}
+FALSE_VALUES = {'false', 'f', 'no', 'n', '0'}
+
+
+class InvalidRow:
+    """Stands in for a row with cells that could not be coerced; ImportPlan.decode() raises its errors."""
+
+    __slots__ = ('row_number', 'errors')
+
+    def __init__(self, row_number, errors):
+        self.row_number = row_number
+        self.errors = errors
+
+    def __str__(self):
+        return f"Row {self.row_number}: {'; '.join(self.errors)}"
+
+
+def get_column_coercer(field):
+    # Returns coerce(values) -> (values, {position: error}) for fields whose cells need converting, else None
+    if isinstance(field, models.DateTimeField):
+        return None
+    if isinstance(field, models.DateField):
+        return _make_coercer(field, _get_date_converters(field))
+    if isinstance(field, models.DecimalField):
+        return _make_coercer(field, _get_decimal_converters(field))
+    if isinstance(field, models.BooleanField):
+        return _make_coercer(field, _get_boolean_converters())
+    return None
+
+
+def _make_coercer(field, converters):
+    # converters maps a cell's type to its conversion, so each cell costs one dict lookup and one call;
+    # types not in the map (e.g. numpy or pyarrow scalars) fall back to the field's to_python()
+    fallback = converters.get(None, field.to_python)
+
+    def coerce(values):
+        errors = {}
+        coerced = []
+        append = coerced.append
+        for position, value in enumerate(values):
+            if value is None:
+                append(None)
+                continue
+            try:
+                append(converters.get(value.__class__, fallback)(value))
+            except Exception:
+                errors[position] = f"Column '{field.name}' has an invalid value {value!r}"
+                append(value)
+        return coerced, errors
+
+    return coerce
+
+
+def _get_date_converters(field):
+    return {
+        datetime.datetime: datetime.datetime.date,
+        datetime.date: _identity,
+        str: lambda value: field.to_python(value.strip()),
+    }
+
+
+def _get_decimal_converters(field):
+    context = field.context
+    exponent = Decimal(1).scaleb(-field.decimal_places)
+    max_digits = field.max_digits
+
+    def quantize(value):
+        # Matches what the database stores: max_digits precision, rounded to decimal_places
+        value = value.quantize(exponent, context=context)
+        if not value.is_finite() or len(value.as_tuple().digits) > max_digits:
+            raise InvalidOperation(value)
+        return value
+
+    def from_float(value):
+        return quantize(context.create_decimal_from_float(value))
+
+    def from_str(value):
+        return quantize(Decimal(value.strip()))
+
+    def from_int(value):
+        return quantize(Decimal(value))
+
+    return {
+        float: from_float,
+        int: from_int,
+        Decimal: quantize,
+        str: from_str,
+        None: lambda value: quantize(field.to_python(value)),
+    }
+
+
+def _get_boolean_converters():
+    def from_str(value):
+        text = value.strip().lower()
+        if text in TRUE_VALUES:
+            return True
+        if text in FALSE_VALUES:
+            return False
+        raise ValueError(value)
+
+    def from_int(value):
+        if value in (0, 1):
+            return bool(value)
+        raise ValueError(value)
+
+    return {bool: _identity, str: from_str, int: from_int, float: from_int}
+
+
+def _identity(value):
+    return value
@@ -0,0 +1,66 @@
+import json
+import os
+from pathlib import Path
+
+
+class ImportStateStore:
+    """
+    Small JSON state file kept per app between import runs: the checkpoint of a chunked import, the
+    fingerprint of each sheet as last imported, keyed by database and model, and the indexes dropped by
+    --defer-indexes until they're rebuilt, keyed by database.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.state = self._read()
+
+    def get_checkpoint(self, workbook_hash):
+        # Only a checkpoint taken from the very same workbook can be resumed
+        checkpoint = self.state.get('checkpoint')
+        if checkpoint and checkpoint.get('workbook_hash') == workbook_hash:
+            return checkpoint
+        return None
+
+    def save_checkpoint(self, workbook_hash, sheet, row, completed_sheets):
+        self.state['checkpoint'] = {
+            'workbook_hash': workbook_hash,
+            'sheet': sheet,
+            'row': row,
+            'completed_sheets': list(completed_sheets),
+        }
+        self._write()
+
+    def clear_checkpoint(self):
+        if self.state.pop('checkpoint', None) is not None:
+            self._write()
+
+    def get_fingerprint(self, key):
+        return self.state.get('fingerprints', {}).get(key)
+
+    def save_fingerprint(self, key, fingerprint):
+        self.state.setdefault('fingerprints', {})[key] = fingerprint
+        self._write()
+
+    def get_deferred_indexes(self, key):
+        return [tuple(index) for index in self.state.get('deferred_indexes', {}).get(key, [])]
+
+    def save_deferred_indexes(self, key, indexes):
+        if indexes:
+            self.state.setdefault('deferred_indexes', {})[key] = [list(index) for index in indexes]
+        elif self.state.get('deferred_indexes', {}).pop(key, None) is None:
+            return
+        self._write()
+
+    def _read(self):
+        if not self.path.is_file():
+            return {}
+        with open(self.path) as f:
+            return json.load(f)
+
+    def _write(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename so a crash mid-write never leaves a truncated state file behind
+        tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f, indent=2, default=str)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,187 @@
+import tracemalloc
+from time import perf_counter
+from django.db import connections
+
+
+class ImportStats:
+    """
+    Collects timings, query counts and row throughput for an import, per sheet and per phase.
+
+    Phases: 'load' (opening the source), 'plan' (compiling the sheet's import plan), 'read' (parsing rows,
+    or waiting on the --pipeline reader), 'prepare' (column-batched date/decimal/boolean conversion and
+    choice/FK resolution), 'decode' (building row data), 'write' (per-row writes or batching), 'tree_insert'
+    (MP_Node rows), 'flush' (bulk writes), 'commit', 'checkpoint', 'index_rebuild' (--defer-indexes) and
+    'validate' (--dry-run).
+    Queries are counted with a connection execute wrapper and attributed to the sheet and phase running
+    when they were issued.
+
+    Callbacks are called as callback(event, data): ('sheet_started', {'model'}) and ('sheet', sheet_stats)
+    around each sheet, and ('import', summary) once the import finishes, so the numbers can be forwarded to
+    other metrics. The importer reports its own progress through notify() as well. Queries issued by
+    callbacks, e.g. to store progress, aren't counted.
+    """
+
+    def __init__(self, trace_memory=False, callbacks=None):
+        # tracemalloc slows allocation-heavy code noticeably, so peak memory is only measured on request
+        self.trace_memory = trace_memory
+        self.callbacks = list(callbacks or [])
+        self.phases = {}
+        self.sheets = {}
+        self.current_sheet = None
+        self.current_phase = None
+        self.started_at = None
+        self.elapsed = 0
+        self.peak_memory = None
+        self._started_tracemalloc = False
+        self._wrappers = []
+        self._notifying = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.finish()
+
+    def start(self):
+        self.started_at = perf_counter()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        for connection in connections.all():
+            wrapper = connection.execute_wrapper(self._count_query)
+            wrapper.__enter__()
+            self._wrappers.append(wrapper)
+
+    def finish(self):
+        for wrapper in reversed(self._wrappers):
+            wrapper.__exit__(None, None, None)
+        self._wrappers = []
+        if self.trace_memory and tracemalloc.is_tracing():
+            self.peak_memory = max(self.peak_memory or 0, tracemalloc.get_traced_memory()[1])
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+        self.elapsed = perf_counter() - self.started_at
+        summary = self.as_dict()
+        self.notify('import', summary)
+        return summary
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def sheet(self, model_name):
+        return _Sheet(self, model_name)
+
+    def add_rows(self, count):
+        if self.current_sheet:
+            self.current_sheet['rows'] += count
+
+    def timed_iter(self, iterable, phase):
+        # Times each next() on an iterator, e.g. parsing rows out of a worksheet
+        iterator = iter(iterable)
+        while True:
+            with self.phase(phase):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def merge_sheet(self, sheet_stats):
+        # Stats returned by a parallel worker process
+        self.sheets[sheet_stats['model']] = sheet_stats
+        for name, phase in sheet_stats['phases'].items():
+            totals = self.phases.setdefault(name, {'seconds': 0, 'queries': 0})
+            totals['seconds'] += phase['seconds']
+            totals['queries'] += phase['queries']
+        if sheet_stats.get('peak_memory') is not None:
+            self.peak_memory = max(self.peak_memory or 0, sheet_stats['peak_memory'])
+        self.notify('sheet', sheet_stats)
+
+    def as_dict(self):
+        rows = sum(sheet['rows'] for sheet in self.sheets.values())
+        return {
+            'seconds': self.elapsed,
+            'rows': rows,
+            'rows_per_second': rows / self.elapsed if self.elapsed else None,
+            'queries': sum(phase['queries'] for phase in self.phases.values()),
+            'peak_memory': self.peak_memory,
+            'phases': self.phases,
+            'sheets': self.sheets,
+        }
+
+    def _add(self, phase, seconds=0, queries=0):
+        for phases in (self.phases, self.current_sheet['phases'] if self.current_sheet else None):
+            if phases is not None:
+                totals = phases.setdefault(phase, {'seconds': 0, 'queries': 0})
+                totals['seconds'] += seconds
+                totals['queries'] += queries
+
+    def _count_query(self, execute, sql, params, many, context):
+        # Attributed to the running phase; only its count is added here, the time is part of the phase
+        if self._notifying:
+            return execute(sql, params, many, context)
+        self._add(self.current_phase.name if self.current_phase else 'other', queries=1)
+        if self.current_sheet:
+            self.current_sheet['queries'] += 1
+        return execute(sql, params, many, context)
+
+    def notify(self, event, data):
+        self._notifying = True
+        try:
+            for callback in self.callbacks:
+                callback(event, data)
+        finally:
+            self._notifying = False
+
+
+class _Phase:
+    __slots__ = ('stats', 'name', 'outer', 'start', 'nested')
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.outer = self.stats.current_phase
+        self.stats.current_phase = self
+        self.nested = 0
+        self.start = perf_counter()
+
+    def __exit__(self, *exc_info):
+        elapsed = perf_counter() - self.start
+        # Phases record their own time only, e.g. 'commit' excludes the writes inside its transaction
+        self.stats._add(self.name, seconds=elapsed - self.nested)
+        if self.outer:
+            self.outer.nested += elapsed
+        self.stats.current_phase = self.outer
+
+
+class _Sheet:
+    def __init__(self, stats, model_name):
+        self.stats = stats
+        self.model_name = model_name
+
+    def __enter__(self):
+        self.sheet_stats = {'model': self.model_name, 'seconds': 0, 'rows': 0, 'queries': 0, 'phases': {}}
+        self.stats.current_sheet = self.sheet_stats
+        self.stats.notify('sheet_started', {'model': self.model_name})
+        if self.stats.trace_memory and tracemalloc.is_tracing():
+            # Each sheet reports its own peak; the import keeps the highest
+            self.stats.peak_memory = max(self.stats.peak_memory or 0, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        self.start = perf_counter()
+        return self.sheet_stats
+
+    def __exit__(self, *exc_info):
+        sheet_stats = self.sheet_stats
+        sheet_stats['seconds'] = perf_counter() - self.start
+        sheet_stats['rows_per_second'] = (
+            sheet_stats['rows'] / sheet_stats['seconds'] if sheet_stats['seconds'] else None
+        )
+        if self.stats.trace_memory and tracemalloc.is_tracing():
+            sheet_stats['peak_memory'] = tracemalloc.get_traced_memory()[1]
+            self.stats.peak_memory = max(self.stats.peak_memory or 0, sheet_stats['peak_memory'])
+        self.stats.sheets[self.model_name] = sheet_stats
+        self.stats.current_sheet = None
+        self.stats.notify('sheet', sheet_stats)
@@ -1,21 +1,21 @@
 import inspect
+from decimal import Decimal
+from functools import lru_cache
 from django.db import models
+from treebeard.mp_tree import MP_Node
+from import_export.utils.mp_node_helpers import MP_NODE_AUTO_FIELDS
 
 
-def resolve_foreign_key(field, raw_value, choice_maps=None):
+def resolve_foreign_key(field, raw_value, choice_maps=None, key_cache=None):
     related_model = field.remote_field.model
 
     if not isinstance(raw_value, (tuple, list)):
         raw_value = (raw_value,)
 
-    if hasattr(related_model.objects, 'get_by_natural_key'):
-        try:
-            sig = inspect.signature(related_model.objects.get_by_natural_key)
-            key_fields = list(sig.parameters.keys())
-        except Exception:
-            raise ValueError(f"Could not introspect natural_key() for {related_model.__name__}")
-    else:
-        raise ValueError(f"{related_model.__name__} must implement natural_key()")
+    if key_cache is not None and not any(isinstance(value, models.Model) for value in raw_value):
+        return _resolve_cached_foreign_key(related_model, raw_value, choice_maps, key_cache)
+
+    key_fields = get_natural_key_fields(related_model)
 
     cleaned_key = []
     for i, key_part in enumerate(key_fields):
@@ -31,8 +31,7 @@ def resolve_foreign_key(field, raw_value, choice_maps=None):
             elif rel_field.is_relation:
                 # It's a ForeignKey — look deeper
                 nested_model = rel_field.remote_field.model
-                code_obj = nested_model.objects.get_by_natural_key.__code__
-                nested_key_fields = list(code_obj.co_varnames[:code_obj.co_argcount])[1:]
+                nested_key_fields = get_natural_key_fields(nested_model)
                 if len(nested_key_fields) == 1:
                     nested_key_field = nested_key_fields[0]
                     model_choices = choice_maps.get(nested_model.__name__, {}).get(nested_key_field)
@@ -63,14 +62,57 @@ def resolve_foreign_key(field, raw_value, choice_maps=None):
         raise ValueError(f"{related_model.__name__} with natural key {cleaned_key} not found.")
 
 
-def get_cleaned_field_value(field, raw_value, choice_maps=None):
-    if field.choices and choice_maps:
-        model_choices = choice_maps.get(field.model.__name__, {})
-        if field.name in model_choices:
-            return _map_choice_display_to_value(raw_value, model_choices[field.name])
-    elif field.is_relation and (field.many_to_one or field.one_to_one):
-        return resolve_foreign_key(field, raw_value, choice_maps)
-    return raw_value
+def _resolve_cached_foreign_key(related_model, raw_value, choice_maps, key_cache):
+    key_paths = key_cache.get_key_paths(related_model)
+    if len(key_paths) != len(raw_value):
+        raise NotImplementedError(
+            f"Compound nested natural keys are not yet supported for {related_model.__name__}: "
+            f"{[path for path, _ in key_paths]}"
+        )
+    cleaned_key = []
+    for (_, leaf_field), value in zip(key_paths, raw_value):
+        # Choice labels are mapped on the leaf field, which may sit behind a nested FK
+        if choice_maps and leaf_field.choices:
+            model_choices = choice_maps.get(leaf_field.model.__name__, {}).get(leaf_field.name)
+            if model_choices:
+                value = _map_choice_display_to_value(value, model_choices)
+        cleaned_key.append(value)
+    return key_cache.resolve(related_model, cleaned_key)
+
+
+@lru_cache(maxsize=None)
+def get_natural_key_fields(model):
+    # Natural key field names, taken from the get_by_natural_key() signature
+    if not hasattr(model.objects, 'get_by_natural_key'):
+        raise ValueError(f"{model.__name__} must implement get_by_natural_key()")
+    try:
+        return tuple(inspect.signature(model.objects.get_by_natural_key).parameters)
+    except Exception:
+        raise ValueError(f"Could not introspect get_by_natural_key() for {model.__name__}")
+
+
+def get_model_fields(model):
+    # Concrete, importable fields keyed by name; tree bookkeeping fields are managed by treebeard
+    field_map = {}
+    for field in model._meta.fields:
+        if issubclass(model, MP_Node) and field.name in MP_NODE_AUTO_FIELDS:
+            continue
+        if isinstance(field, models.Field) and not field.auto_created:
+            field_map[field.name] = field
+    return field_map
+
+
+def get_comparable_value(field, value):
+    # Normalises a cleaned cell value and a stored value the same way so they can be compared for changes
+    if value is None:
+        return None
+    if isinstance(value, models.Model):
+        return value.pk
+    value = field.to_python(value)
+    if isinstance(field, models.DecimalField):
+        # Stored decimals come back quantized to decimal_places, e.g. Excel floats for FinancialData.actual
+        value = value.quantize(Decimal(1).scaleb(-field.decimal_places), context=field.context)
+    return value
 
 
 def _map_choice_display_to_value(display_value, choices_dict):
@@ -1,3 +1,6 @@
+from django.db import models
+from treebeard.exceptions import PathOverflow
+
 MP_NODE_AUTO_FIELDS = {"path", "depth", "numchild"}
 
 def create_mp_node(model, data):
@@ -10,3 +13,190 @@ def create_mp_node(model, data):
             return parent.add_child(**data), True
         else:
             return model.add_root(**data), True
+
+
+class _TreeNode:
+    __slots__ = ('pk', 'key', 'step', 'parent', 'children', 'order_values', 'data', 'path', 'depth', 'numchild')
+
+    def __init__(self, key, step=None, parent=None, order_values=(), data=None, pk=None,
+                 path=None, depth=None, numchild=0):
+        self.pk = pk
+        self.key = key
+        self.step = step
+        self.parent = parent
+        self.children = []
+        self.order_values = order_values
+        self.data = data
+        # Stored path/depth/numchild of existing nodes, used to detect which rows actually change
+        self.path = path
+        self.depth = depth
+        self.numchild = numchild
+
+
+class MPNodeBulkLoader:
+    """
+    Loads a whole MP_Node sheet at once instead of one add_root()/add_child() call per row.
+
+    Rows are placed parents-first in memory, and each insertion is replayed exactly as treebeard would
+    perform it (appending after the last sibling, or, when node_order_by is set, a sorted insertion that
+    shifts later siblings right up to the first gap in their steps). path/depth/numchild are then derived
+    from the resulting steps using the model's steplen and alphabet, so the stored tree is identical to the
+    one add_child() would build.
+    Existing nodes are left as they are, like create_mp_node(), apart from paths shifted by sorted inserts.
+    """
+
+    def __init__(self, model, lookup_fields, batch_size=1000):
+        self.model = model
+        self.lookup_fields = [model._meta.get_field(name) for name in lookup_fields]
+        self.order_fields = [model._meta.get_field(name) for name in (model.node_order_by or [])]
+        self.batch_size = batch_size
+        self.pending = []
+        self.created_count = 0
+        self.updated_count = 0
+
+    def add(self, lookup_data, data):
+        self.pending.append(data)
+
+    def flush(self):
+        if not self.pending:
+            return
+
+        roots, nodes = self._load_existing_tree()
+        new_nodes = []
+        new_keys = set()
+        waiting = {}
+
+        def place(node, parent):
+            node.parent = parent
+            siblings = parent.children if parent else roots
+            self._insert_sibling(siblings, node)
+            nodes[node.key] = node
+            new_nodes.append(node)
+            # Rows that appeared before their parent can be placed now
+            for child in waiting.pop(node.key, []):
+                place(child, node)
+
+        for data in self.pending:
+            data = dict(data)
+            parent_key = data.pop('parent', None)
+            key = self._make_key(data[field.name] for field in self.lookup_fields)
+            if key in nodes or key in new_keys:
+                # Already in the tree (or earlier in this sheet): left untouched, as create_mp_node does
+                self.updated_count += 1
+                continue
+            new_keys.add(key)
+
+            node = _TreeNode(key, order_values=self._get_order_values(data), data=data)
+            if parent_key is None:
+                place(node, None)
+                continue
+            parent_key = self._make_key([parent_key])
+            if parent_key in nodes:
+                place(node, nodes[parent_key])
+            else:
+                waiting.setdefault(parent_key, []).append(node)
+
+        if waiting:
+            missing = ", ".join(str(list(key)) for key in waiting)
+            raise ValueError(f"{self.model.__name__} parent not found for natural key(s): {missing}")
+
+        self._write(roots, new_nodes)
+        self.created_count += len(new_nodes)
+        self.pending = []
+
+    def _load_existing_tree(self):
+        steplen = self.model.steplen
+        fields = ['pk', 'path', 'depth', 'numchild'] + [f.attname for f in self.lookup_fields + self.order_fields]
+        key_len = len(self.lookup_fields)
+        roots = []
+        nodes = {}
+        by_path = {}
+
+        for pk, path, depth, numchild, *values in self.model.objects.order_by('path').values_list(*fields):
+            parent = by_path.get(path[:-steplen]) if depth > 1 else None
+            node = _TreeNode(
+                tuple(values[:key_len]), step=self.model._str2int(path[-steplen:]), parent=parent,
+                order_values=tuple(values[key_len:]), pk=pk, path=path, depth=depth, numchild=numchild
+            )
+            (parent.children if parent else roots).append(node)
+            by_path[path] = node
+            nodes[node.key] = node
+        return roots, nodes
+
+    def _insert_sibling(self, siblings, node):
+        # Mirrors MP_AddChildHandler/MP_AddRootHandler: siblings are kept in path (step) order
+        if self.order_fields:
+            for index, sibling in enumerate(siblings):
+                if self._sorts_after(sibling.order_values, node.order_values):
+                    # sorted-sibling insert: take this sibling's step and move it and later siblings right,
+                    # stopping at the first gap in the steps, which absorbs the shift (treebeard compresses holes)
+                    node.step = sibling.step
+                    prior_step = node.step
+                    for moved in siblings[index:]:
+                        if moved.step > prior_step:
+                            break
+                        moved.step += 1
+                        prior_step = moved.step
+                    siblings.insert(index, node)
+                    return
+        node.step = siblings[-1].step + 1 if siblings else 1
+        siblings.append(node)
+
+    def _write(self, roots, new_nodes):
+        changed = []
+        stack = [(root, '', 1) for root in reversed(roots)]
+        while stack:
+            node, parent_path, depth = stack.pop()
+            key = self.model._int2str(node.step)
+            if len(key) > self.model.steplen:
+                raise PathOverflow(f"Path Overflow from: '{parent_path}'")
+            path = f"{parent_path}{self.model.alphabet[0] * (self.model.steplen - len(key))}{key}"
+            if node.pk is not None and (path, depth, len(node.children)) != (node.path, node.depth, node.numchild):
+                changed.append((node, node.path))
+            node.path, node.depth, node.numchild = path, depth, len(node.children)
+            stack.extend((child, path, depth + 1) for child in reversed(node.children))
+
+        if changed:
+            self._update_existing(changed)
+
+        self.model.objects.bulk_create(
+            [
+                self.model(**node.data, path=node.path, depth=node.depth, numchild=node.numchild)
+                for node in new_nodes
+            ],
+            batch_size=self.batch_size
+        )
+
+    def _update_existing(self, changed):
+        moved = [self.model(pk=node.pk, path=f"~{node.pk}") for node, old_path in changed if node.path != old_path]
+        if moved:
+            # Park moved nodes on unique placeholder paths first so shifted siblings never collide mid-update
+            self.model.objects.bulk_update(moved, ['path'], batch_size=self.batch_size)
+        self.model.objects.bulk_update(
+            [self.model(pk=node.pk, path=node.path, depth=node.depth, numchild=node.numchild) for node, _ in changed],
+            ['path', 'depth', 'numchild'],
+            batch_size=self.batch_size
+        )
+
+    def _get_order_values(self, data):
+        return tuple(field.to_python(data.get(field.name)) for field in self.order_fields)
+
+    def _make_key(self, values):
+        return tuple(
+            value.pk if isinstance(value, models.Model) else field.to_python(value)
+            for field, value in zip(self.lookup_fields, values)
+        )
+
+    @staticmethod
+    def _sorts_after(existing_values, new_values):
+        # Same test as treebeard's get_sorted_pos_queryset(): (f1 > v1) | (f1 == v1 & f2 > v2) | ...
+        for existing, new in zip(existing_values, new_values):
+            if existing is None and new is None:
+                continue
+            if existing is None or new is None:
+                return False
+            if existing > new:
+                return True
+            if existing != new:
+                return False
+        return False
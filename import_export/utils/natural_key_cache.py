@@ -0,0 +1,120 @@
+from django.db import models, router
+from import_export.utils.model_helpers import get_natural_key_fields
+
+
+class NaturalKeyCache:
+    """
+    Maps natural keys to primary keys for related models so foreign key cells resolve from a
+    dictionary instead of a get_by_natural_key() query per cell.
+
+    Each model's keys are loaded with a single query the first time the model is resolved.
+    Nested foreign keys inside a natural key (e.g. FiscalYearPeriod's fiscal_year and period) are
+    followed through joins, so keys are always expressed in the leaf values found in the sheet.
+    """
+
+    def __init__(self):
+        self.key_maps = {}
+        self.instances = {}
+        self.key_paths = {}
+        # Keys seen in the workbook but not in the database, used when validating without writing
+        self.pending_keys = {}
+
+    def get_key_paths(self, model):
+        # [(lookup_path, leaf_field)] for each part of the model's natural key
+        if model not in self.key_paths:
+            paths = []
+            for field_name in get_natural_key_fields(model):
+                field = model._meta.get_field(field_name)
+                if field.is_relation:
+                    # Compound nested keys flatten into one leaf per field, e.g. FinancialData's fiscal_year_period
+                    for nested_path, leaf_field in self.get_key_paths(field.remote_field.model):
+                        paths.append((f"{field_name}__{nested_path}", leaf_field))
+                else:
+                    paths.append((field_name, field))
+            self.key_paths[model] = paths
+        return self.key_paths[model]
+
+    def resolve(self, model, key_values):
+        key_map = self.key_maps.get(model)
+        if key_map is None:
+            key_map = self.load(model)
+
+        key = self.make_key(model, key_values)
+        try:
+            pk = key_map[key]
+        except KeyError:
+            pending = self.pending_keys.get(model, {})
+            if key in pending:
+                return pending[key]
+            raise ValueError(f"{model.__name__} with natural key {list(key)} not found.")
+        return self._get_instance(model, pk, key)
+
+    def contains(self, model, key):
+        # key must already be normalised with make_key()
+        key_map = self.key_maps.get(model)
+        if key_map is None:
+            key_map = self.load(model)
+        return key in key_map
+
+    def add_pending(self, model, key):
+        # Makes a key that only exists in the workbook resolvable by later sheets
+        if key not in self.pending_keys.setdefault(model, {}):
+            instance = model()
+            instance._natural_key = key
+            self.pending_keys[model][key] = instance
+
+    def get_key_from_data(self, model, data):
+        # The model's own natural key, in leaf values, from a decoded row
+        key_values = []
+        for field_name in get_natural_key_fields(model):
+            value = data.get(field_name)
+            if isinstance(value, models.Model):
+                key_values.extend(self.get_instance_key(value))
+            else:
+                key_values.append(value)
+        return self.make_key(model, key_values)
+
+    def get_instance_key(self, instance):
+        key = getattr(instance, '_natural_key', None)
+        if key is None:
+            paths = [path for path, _ in self.get_key_paths(type(instance))]
+            key = tuple(type(instance)._default_manager.filter(pk=instance.pk).values_list(*paths).get())
+            instance._natural_key = key
+        return key
+
+    def load(self, model):
+        paths = [path for path, _ in self.get_key_paths(model)]
+        key_map = {}
+        for pk, *key in model._default_manager.values_list('pk', *paths).iterator(chunk_size=5000):
+            key_map[tuple(key)] = pk
+        self.key_maps[model] = key_map
+        self.instances[model] = {}
+        return key_map
+
+    def make_key(self, model, key_values):
+        # Normalise sheet values to what the database returns, e.g. datetime -> date, int -> str
+        return tuple(
+            leaf_field.to_python(value)
+            for (_, leaf_field), value in zip(self.get_key_paths(model), key_values)
+        )
+
+    def invalidate(self, model=None):
+        # Drop cached keys once rows for a model have been written
+        if model is None:
+            self.key_maps.clear()
+            self.instances.clear()
+        else:
+            self.key_maps.pop(model, None)
+            self.instances.pop(model, None)
+
+    def _get_instance(self, model, pk, key):
+        # A pk-only instance is enough to assign a ForeignKey and is shared by every row that uses it
+        instances = self.instances[model]
+        instance = instances.get(pk)
+        if instance is None:
+            instance = model(pk=pk)
+            instance._state.adding = False
+            instance._state.db = router.db_for_read(model)
+            instance._natural_key = key
+            instances[pk] = instance
+        return instance
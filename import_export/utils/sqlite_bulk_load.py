@@ -0,0 +1,120 @@
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class SQLiteBulkLoadSession:
+    """
+    Tunes a SQLite connection for a large load and puts everything back afterwards, even if the load fails:
+
+    - journal_mode (default WAL), so writers append to a log instead of rewriting pages twice
+    - synchronous (default NORMAL), so commits don't wait for an fsync; safe with WAL apart from the last
+      transactions on power loss
+    - cache_size (default -262144, i.e. 256 MiB of page cache)
+    - with defer_indexes, the non-unique indexes of the given models' tables (e.g. FinancialData's foreign
+      key indexes) are dropped for the load and recreated once it's done, so each is built in one pass
+      instead of being maintained on every insert
+
+    Unique indexes and constraints are never touched, as upserts rely on them. Any setting can be left
+    alone by passing None. On other databases the session does nothing.
+
+    Given an ImportStateStore, the dropped indexes' CREATE INDEX statements are saved to it before they're
+    dropped and cleared once rebuilt, and any left there by a process killed mid-load are recreated when
+    the next session starts.
+    """
+
+    def __init__(self, models=(), using=DEFAULT_DB_ALIAS, journal_mode='WAL', synchronous='NORMAL',
+                 cache_size=-262144, defer_indexes=False, state_store=None):
+        self.models = list(models)
+        self.connection = connections[using]
+        self.pragmas = {'journal_mode': journal_mode, 'synchronous': synchronous, 'cache_size': cache_size}
+        self.defer_indexes = defer_indexes
+        self.state_store = state_store
+        self.saved_pragmas = {}
+        # (name, CREATE INDEX statement) of the dropped indexes
+        self.dropped_indexes = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.finish()
+
+    @property
+    def enabled(self):
+        return self.connection.vendor == 'sqlite'
+
+    def start(self):
+        if not self.enabled:
+            return
+        if self.connection.in_atomic_block:
+            # journal_mode can't change inside a transaction, and dropped indexes would roll back with it
+            raise ValueError("A SQLite bulk-load session must be started outside a transaction.")
+        try:
+            with self.connection.cursor() as cursor:
+                for name, value in self.pragmas.items():
+                    if value is None:
+                        continue
+                    cursor.execute(f"PRAGMA {name}")
+                    self.saved_pragmas[name] = cursor.fetchone()[0]
+                    cursor.execute(f"PRAGMA {name} = {value}")
+                if self.state_store:
+                    self._restore_saved_indexes(cursor)
+                if self.defer_indexes:
+                    self._drop_indexes(cursor)
+        except Exception:
+            self.finish()
+            raise
+
+    def finish(self):
+        if not self.enabled:
+            return
+        try:
+            with self.connection.cursor() as cursor:
+                # Indexes first, while the larger cache still helps the rebuild
+                while self.dropped_indexes:
+                    name, sql = self.dropped_indexes[-1]
+                    cursor.execute(sql)
+                    self.dropped_indexes.pop()
+                if self.state_store and self.defer_indexes:
+                    self.state_store.save_deferred_indexes(self.state_key, [])
+        finally:
+            with self.connection.cursor() as cursor:
+                for name, value in self.saved_pragmas.items():
+                    cursor.execute(f"PRAGMA {name} = {value}")
+            self.saved_pragmas = {}
+
+    def get_deferrable_indexes(self, cursor):
+        indexes = []
+        for model in self.models:
+            table = model._meta.db_table
+            cursor.execute(f"PRAGMA index_list({self.connection.ops.quote_name(table)})")
+            # (seq, name, unique, origin, partial); origin 'c' is a CREATE INDEX, the rest back constraints
+            names = [row[1] for row in cursor.fetchall() if not row[2] and row[3] == 'c']
+            for name in names:
+                cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = %s", [name])
+                row = cursor.fetchone()
+                if row and row[0]:
+                    indexes.append((name, row[0]))
+        return indexes
+
+    @property
+    def state_key(self):
+        return f"{self.connection.alias}:{self.connection.settings_dict['NAME']}"
+
+    def _drop_indexes(self, cursor):
+        indexes = self.get_deferrable_indexes(cursor)
+        if self.state_store:
+            # Saved before anything is dropped, so a killed process can't lose the statements
+            self.state_store.save_deferred_indexes(self.state_key, indexes)
+        for name, sql in indexes:
+            cursor.execute(f"DROP INDEX {self.connection.ops.quote_name(name)}")
+            self.dropped_indexes.append((name, sql))
+
+    def _restore_saved_indexes(self, cursor):
+        saved = self.state_store.get_deferred_indexes(self.state_key)
+        for name, sql in saved:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = %s", [name])
+            if not cursor.fetchone():
+                cursor.execute(sql)
+        if saved:
+            self.state_store.save_deferred_indexes(self.state_key, [])
@@ -0,0 +1,38 @@
+import hashlib
+from openpyxl.packaging.relationship import get_dependents, get_rels_path
+from openpyxl.worksheet.table import Table
+from openpyxl.xml.constants import REL_NS
+from openpyxl.xml.functions import fromstring
+
+
+def get_sheet_tables(sheet):
+    """Returns {displayName: Table} for a worksheet, including read-only worksheets."""
+    if hasattr(sheet, '_tables'):
+        return {tbl.displayName: tbl for tbl in sheet._tables.values() if isinstance(tbl, Table)}
+
+    # Read-only worksheets don't parse table parts, so read them straight from the archive
+    archive = sheet.parent._archive
+    rels_path = get_rels_path(sheet._worksheet_path)
+    if rels_path not in archive.namelist():
+        return {}
+
+    tables = {}
+    for rel in get_dependents(archive, rels_path).find(f"{REL_NS}/table"):
+        table = Table.from_tree(fromstring(archive.read(rel.target)))
+        tables[table.displayName] = table
+    return tables
+
+
+def get_file_hash(path, block_size=1 << 20):
+    # path may also be a seekable binary buffer, e.g. an uploaded file or an mmap
+    digest = hashlib.sha256()
+    if hasattr(path, 'read'):
+        path.seek(0)
+        for block in iter(lambda: path.read(block_size), b''):
+            digest.update(block)
+        path.seek(0)
+        return digest.hexdigest()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()